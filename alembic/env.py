@@ -2,6 +2,8 @@ import os
 from logging.config import fileConfig
 from src.infra.sqlalchemy.models.user_log import UserLog
 from src.infra.sqlalchemy.models.user import User
+from src.infra.sqlalchemy.models.user_encoding import UserEncoding
+from src.infra.sqlalchemy.models.gallery_change import GalleryChange
 from src.infra.sqlalchemy.models.admin import Admin
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -0,0 +1,27 @@
+"""Índices para paginação de user_logs
+
+Revision ID: 3a7c5d9e12b8
+Revises: 8e1f3b6c27d4
+Create Date: 2026-10-18 12:00:00.000000
+
+Índices compostos para a paginação por cursor em (log_time, id) e para o
+filtro por usuário e período em GET /users_log.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3a7c5d9e12b8'
+down_revision = '8e1f3b6c27d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_user_logs_log_time_id", "user_logs", ["log_time", "id"])
+    op.create_index("ix_user_logs_user_id_log_time", "user_logs", ["user_id", "log_time"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_logs_user_id_log_time", table_name="user_logs")
+    op.drop_index("ix_user_logs_log_time_id", table_name="user_logs")
@@ -0,0 +1,83 @@
+"""Armazenar encoding facial em formato binário
+
+Revision ID: 5c2d9e7a41f3
+Revises: b14f80cfaed0
+Create Date: 2026-10-18 10:00:00.000000
+
+Converte `users.encoding` de JSON (Text, 128 float64) para 513 bytes:
+1 byte de versão do formato + 128 float32 little-endian.
+As linhas existentes são convertidas em lotes para limitar o uso de memória.
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+import numpy as np
+
+# revision identifiers, used by Alembic.
+revision = '5c2d9e7a41f3'
+down_revision = 'b14f80cfaed0'
+branch_labels = None
+depends_on = None
+
+ENCODING_FORMAT_V1 = 1
+ENCODING_BYTES = 513
+CHUNK_SIZE = 1000
+
+binary_type = sa.LargeBinary(ENCODING_BYTES).with_variant(mysql.VARBINARY(ENCODING_BYTES), "mysql")
+
+
+def _to_binary(raw):
+    if raw is None:
+        return None
+    encoding = np.asarray(json.loads(raw), dtype="<f4")
+    return bytes([ENCODING_FORMAT_V1]) + encoding.tobytes()
+
+
+def _to_json(raw):
+    if raw is None:
+        return None
+    encoding = np.frombuffer(raw, dtype="<f4", offset=1)
+    return json.dumps(encoding.astype(np.float64).tolist())
+
+
+def _convert(source_column, target_column, convert):
+    conn = op.get_bind()
+    users = sa.table(
+        "users",
+        sa.column("id", sa.Integer),
+        sa.column(source_column),
+        sa.column(target_column),
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(users.c.id, users.c[source_column])
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            users.update()
+            .where(users.c.id == sa.bindparam("row_id"))
+            .values({target_column: sa.bindparam("value")}),
+            [{"row_id": row.id, "value": convert(row[1])} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("encoding_bin", binary_type, nullable=True))
+    _convert("encoding", "encoding_bin", _to_binary)
+    op.drop_column("users", "encoding")
+    op.alter_column("users", "encoding_bin", new_column_name="encoding", existing_type=binary_type)
+
+
+def downgrade() -> None:
+    op.add_column("users", sa.Column("encoding_json", sa.Text(), nullable=True))
+    _convert("encoding", "encoding_json", _to_json)
+    op.drop_column("users", "encoding")
+    op.alter_column("users", "encoding_json", new_column_name="encoding", existing_type=sa.Text())
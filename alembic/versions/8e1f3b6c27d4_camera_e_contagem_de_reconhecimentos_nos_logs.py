@@ -0,0 +1,27 @@
+"""Câmera e contagem de reconhecimentos nos logs
+
+Revision ID: 8e1f3b6c27d4
+Revises: 5c2d9e7a41f3
+Create Date: 2026-10-18 11:00:00.000000
+
+Adiciona `user_logs.camera_id` e `user_logs.hits`. Reconhecimentos repetidos
+dentro da janela de de-duplicação são somados em `hits` em vez de gerar linhas novas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8e1f3b6c27d4'
+down_revision = '5c2d9e7a41f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("user_logs", sa.Column("camera_id", sa.String(64), nullable=True))
+    op.add_column("user_logs", sa.Column("hits", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    op.drop_column("user_logs", "hits")
+    op.drop_column("user_logs", "camera_id")
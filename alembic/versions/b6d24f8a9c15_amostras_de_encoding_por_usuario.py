@@ -0,0 +1,36 @@
+"""Amostras de encoding por usuário
+
+Revision ID: b6d24f8a9c15
+Revises: 3a7c5d9e12b8
+Create Date: 2026-10-18 13:00:00.000000
+
+Cria `user_encodings`, com amostras extras do rosto de cada usuário. O encoding
+da foto de cadastro continua em `users.encoding` e é a primeira amostra.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = 'b6d24f8a9c15'
+down_revision = '3a7c5d9e12b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_encodings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("encoding", sa.LargeBinary(513).with_variant(mysql.VARBINARY(513), "mysql"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_user_encodings_id", "user_encodings", ["id"])
+    op.create_index("ix_user_encodings_user_id", "user_encodings", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_encodings_user_id", table_name="user_encodings")
+    op.drop_index("ix_user_encodings_id", table_name="user_encodings")
+    op.drop_table("user_encodings")
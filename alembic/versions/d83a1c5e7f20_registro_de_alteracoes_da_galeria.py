@@ -0,0 +1,35 @@
+"""Registro de alterações da galeria
+
+Revision ID: d83a1c5e7f20
+Revises: b6d24f8a9c15
+Create Date: 2026-10-18 14:00:00.000000
+
+Adiciona a tabela `gallery_changes`, cujo maior id é a versão global da galeria.
+Os workers consultam só as alterações depois da sua versão.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd83a1c5e7f20'
+down_revision = 'b6d24f8a9c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "gallery_changes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("op", sa.String(16), nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_gallery_changes_id", "gallery_changes", ["id"])
+    op.create_index("ix_gallery_changes_user_id", "gallery_changes", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_gallery_changes_user_id", table_name="gallery_changes")
+    op.drop_index("ix_gallery_changes_id", table_name="gallery_changes")
+    op.drop_table("gallery_changes")
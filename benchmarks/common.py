@@ -0,0 +1,46 @@
+import time
+from typing import Callable, List
+
+import numpy as np
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> List[float]:
+    """Executa `fn` `warmup` vezes sem medir e depois `repeat` vezes; devolve os tempos em segundos."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(stage: str, params: dict, samples: List[float], items_per_call: int = 1) -> dict:
+    """Percentis de latência (ms) e vazão (itens por segundo) de uma etapa."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    total = float(np.sum(samples))
+    return {
+        "stage": stage,
+        "params": params,
+        "calls": len(samples),
+        "items_per_call": items_per_call,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "throughput_per_s": (len(samples) * items_per_call / total) if total > 0 else 0.0,
+    }
+
+
+def result_key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['stage']}[{params}]"
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result_key(result):<58} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms"
+        f"  p99 {result['p99_ms']:9.3f} ms  {result['throughput_per_s']:11.1f}/s"
+    )
@@ -0,0 +1,56 @@
+"""
+Compara duas execuções de benchmarks.run.
+
+Uso:
+    python -m benchmarks.compare base.json novo.json [--threshold 0.10]
+
+Sai com código 1 se alguma etapa ficou mais lenta (p50) além do limite.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import result_key
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return {result_key(result): result for result in json.load(f)["results"]}
+
+
+def _change(base: float, new: float) -> float:
+    return (new - base) / base if base else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Piora máxima aceita no p50 (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    base, new = _load(args.base), _load(args.new)
+    regressions = []
+    print(f"{'etapa':<58} {'p50 base':>10} {'p50 novo':>10} {'Δp50':>8} {'Δp95':>8} {'Δvazão':>8}")
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key], new[key]
+        p50, p95 = _change(b["p50_ms"], n["p50_ms"]), _change(b["p95_ms"], n["p95_ms"])
+        throughput = _change(b["throughput_per_s"], n["throughput_per_s"])
+        flag = " <-- mais lento" if p50 > args.threshold else ""
+        if flag:
+            regressions.append(key)
+        print(
+            f"{key:<58} {b['p50_ms']:10.3f} {n['p50_ms']:10.3f} {p50:+8.1%} {p95:+8.1%} {throughput:+8.1%}{flag}"
+        )
+    for key in sorted(base.keys() - new.keys()):
+        print(f"{key:<58} só na base")
+    for key in sorted(new.keys() - base.keys()):
+        print(f"{key:<58} só no novo")
+
+    if regressions:
+        print(f"\n{len(regressions)} etapa(s) mais lenta(s) que o limite de {args.threshold:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
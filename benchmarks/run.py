@@ -0,0 +1,267 @@
+"""
+Benchmarks das etapas do reconhecimento, com SQLite no lugar do MySQL e sem rede.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000,10000,100000,1000000 --index ivf
+    python -m benchmarks.run --images images --output benchmarks/results/base.json
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/novo.json
+
+Etapas medidas separadamente: decodificação, detecção, encoding (precisam do
+face_recognition; sem ele são puladas), carga da galeria (do banco e da
+fotografia em disco), busca na galeria e gravação dos logs.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.common import format_result, measure, summarize
+
+DEFAULT_SIZES = "1000,10000,100000"
+# Desvio padrão das componentes dos encodings sintéticos: a distância entre duas
+# pessoas diferentes fica perto de 0.65, como nos encodings reais do dlib.
+SYNTHETIC_SCALE = 0.04
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de reconhecimento facial.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Tamanhos das galerias sintéticas (separados por vírgula)")
+    parser.add_argument("--images", default="images", help="Pasta com imagens de rostos; sem imagens usa imagens sintéticas")
+    parser.add_argument("--profiles", default="", help="Perfis de detecção (padrão: todos)")
+    parser.add_argument("--index", default="exact", choices=["exact", "ivf"], help="Busca exaustiva ou índice IVF")
+    parser.add_argument("--batch-sizes", default="1,8", help="Rostos por chamada na busca e nos logs")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetições por etapa de imagem")
+    parser.add_argument("--output", default="", help="Arquivo JSON de saída (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _load_images(directory: str, rng) -> list:
+    """Imagens do diretório indicado ou, se não houver, imagens sintéticas em duas resoluções."""
+    import cv2
+    import numpy as np
+
+    images = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(directory, name), "rb") as f:
+                    images.append((name, f.read()))
+    if images:
+        return images
+    for width, height in ((640, 480), (1280, 720)):
+        noise = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(noise, (0, 0), 3)
+        images.append((f"synthetic_{width}x{height}", cv2.imencode(".jpg", image)[1].tobytes()))
+    return images
+
+
+def bench_image_stages(args, rng, results):
+    try:
+        import cv2
+        import face_recognition
+        from src.infra.recognition.detection import PROFILES, locate_faces
+        from src.infra.recognition.pipeline import decode_image, detect_and_encode
+    except ImportError as e:
+        print(f"Etapas de imagem puladas (dependência ausente: {e}).")
+        return
+
+    profiles = [name for name in args.profiles.split(",") if name] or list(PROFILES)
+    for image_name, content in _load_images(args.images, rng):
+        for profile_name in profiles:
+            profile = PROFILES[profile_name]
+            params = {"image": image_name, "profile": profile_name}
+
+            results.append(summarize("decode", params, measure(lambda: decode_image(content, profile.decode_reduction), args.repeat)))
+
+            image_bgr = decode_image(content, profile.decode_reduction)
+            results.append(summarize("detect", params, measure(lambda: locate_faces(image_bgr, profile), args.repeat)))
+
+            boxes, image_rgb = locate_faces(image_bgr, profile)
+            if image_rgb is None:
+                image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+            if not boxes:
+                # Sem rosto (imagem sintética): mede o encoding numa caixa central
+                height, width = image_rgb.shape[:2]
+                side = min(height, width) // 2
+                top, left = (height - side) // 2, (width - side) // 2
+                boxes = [(top, left + side, top + side, left)]
+            results.append(summarize(
+                "encode", dict(params, faces=len(boxes)),
+                measure(lambda: face_recognition.face_encodings(image_rgb, boxes, profile.num_jitters), args.repeat),
+                items_per_call=len(boxes),
+            ))
+
+            results.append(summarize("detect_and_encode", params, measure(lambda: detect_and_encode(content, profile_name), args.repeat)))
+            for result in results[-4:]:
+                print(format_result(result))
+
+
+def _populate(size: int, rng):
+    """Recria as tabelas e insere `size` usuários com encodings sintéticos."""
+    import numpy as np
+    from sqlalchemy import insert
+    from src.infra.recognition.codec import encode_face_encoding
+    from src.infra.sqlalchemy.database import Base, engine
+    from src.infra.sqlalchemy.models.admin import Admin  # noqa: F401 (registra as tabelas)
+    from src.infra.sqlalchemy.models.gallery_change import GalleryChange  # noqa: F401
+    from src.infra.sqlalchemy.models.user import User
+    from src.infra.sqlalchemy.models.user_encoding import UserEncoding  # noqa: F401
+    from src.infra.sqlalchemy.models.user_log import UserLog  # noqa: F401
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    encodings = rng.normal(0.0, SYNTHETIC_SCALE, (size, 128)).astype(np.float32)
+    with engine.begin() as connection:
+        for start in range(0, size, 10000):
+            connection.execute(insert(User), [
+                {
+                    "name": f"Usuario {i}",
+                    "cellphone": str(10_000_000_000 + i),
+                    "image_path": "",
+                    "encoding": encode_face_encoding(encodings[i]),
+                }
+                for i in range(start, min(start + 10000, size))
+            ])
+    return encodings
+
+
+def bench_gallery(args, size: int, rng, results):
+    import numpy as np
+    from src.infra.recognition.gallery import FaceGallery
+    from src.infra.recognition.index import IVFIndex
+    from src.infra.recognition.snapshot_store import SnapshotStore
+    from src.infra.sqlalchemy.database import SessionLocal
+
+    print(f"\nGaleria sintética com {size} encodings")
+    encodings = _populate(size, rng)
+    load_repeat = 3 if size <= 100_000 else 1
+
+    db = SessionLocal()
+    try:
+        results.append(summarize(
+            "gallery_load_db", {"size": size},
+            measure(lambda: FaceGallery().ensure_loaded(db), load_repeat, warmup=0), items_per_call=size,
+        ))
+        print(format_result(results[-1]))
+
+        store_dir = tempfile.mkdtemp(prefix="gallery-", dir=os.environ["GALLERY_SNAPSHOT_DIR"])
+        FaceGallery(store=SnapshotStore(store_dir)).ensure_loaded(db)
+        results.append(summarize(
+            "gallery_load_snapshot", {"size": size},
+            measure(lambda: FaceGallery(store=SnapshotStore(store_dir)).ensure_loaded(db), load_repeat, warmup=0),
+            items_per_call=size,
+        ))
+        print(format_result(results[-1]))
+
+        index = IVFIndex() if args.index == "ivf" else None
+        gallery = FaceGallery(index=index)
+        if index is not None:
+            results.append(summarize(
+                "index_build", {"size": size, "index": args.index},
+                # O índice é montado numa thread: mede até ele ficar pronto
+                measure(lambda: (gallery.reload(db), gallery.wait_index()), 1, warmup=0), items_per_call=size,
+            ))
+            print(format_result(results[-1]))
+        else:
+            gallery.ensure_loaded(db)
+    finally:
+        db.close()
+
+    # Consultas: rostos da galeria com ruído (reconhecidos) e rostos novos (desconhecidos)
+    repeat = max(5, min(200, int(2e8 / (size * 128))))
+    for batch_size in [int(b) for b in args.batch_sizes.split(",") if b]:
+        rows = rng.integers(0, size, batch_size)
+        known = encodings[rows] + rng.normal(0.0, 0.01, (batch_size, 128)).astype(np.float32)
+        unknown = rng.normal(0.0, SYNTHETIC_SCALE, (batch_size, 128)).astype(np.float32)
+        for kind, queries in (("known", known), ("unknown", unknown)):
+            params = {"size": size, "batch": batch_size, "queries": kind, "index": args.index}
+            results.append(summarize(
+                "match", params, measure(lambda: gallery.match(queries, 0.6), repeat), items_per_call=batch_size,
+            ))
+            print(format_result(results[-1]))
+
+
+def bench_log_write(args, results):
+    from datetime import datetime as dt
+    from src.infra.sqlalchemy.database import SessionLocal
+    from src.infra.sqlalchemy.log_writer import UserLogWriter
+    from src.infra.sqlalchemy.repositories.user_log import UserLogRepository
+
+    print("\nGravação de logs")
+    db = SessionLocal()
+    try:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",") if b]:
+            entries = [(1 + i, dt.now(), "bench") for i in range(batch_size)]
+            results.append(summarize(
+                "log_write_sync", {"batch": batch_size},
+                measure(lambda: UserLogRepository(db).create_many(entries), 50), items_per_call=batch_size,
+            ))
+            print(format_result(results[-1]))
+    finally:
+        db.close()
+
+    writer = UserLogWriter(session_factory=SessionLocal)
+    batch = [("insert", {"user_id": 1 + i, "log_time": dt.now(), "camera_id": "bench"}) for i in range(writer.batch_size)]
+    results.append(summarize(
+        "log_writer_flush", {"batch": writer.batch_size},
+        measure(lambda: writer._flush(batch), 20), items_per_call=writer.batch_size,
+    ))
+    print(format_result(results[-1]))
+
+
+def main():
+    args = _parse_args()
+
+    # Banco e arquivos temporários: o benchmark nunca toca o banco configurado no ambiente
+    workdir = tempfile.mkdtemp(prefix="facerec-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+    os.environ["GALLERY_SNAPSHOT_DIR"] = os.path.join(workdir, "gallery")
+    os.environ["FACE_INDEX_PATH"] = os.path.join(workdir, "face_index.npz")
+    os.environ["LOG_WRITER_ENABLED"] = "false"
+    os.makedirs(os.environ["GALLERY_SNAPSHOT_DIR"], exist_ok=True)
+
+    import numpy as np
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    bench_image_stages(args, rng, results)
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        bench_gallery(args, size, rng, results)
+    bench_log_write(args, results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
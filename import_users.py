@@ -0,0 +1,47 @@
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.infra.recognition.workers import RecognitionPool
+from src.infra.sqlalchemy.user_import import IMPORT_CHUNK_SIZE, UserImporter
+
+
+def import_users():
+    parser = argparse.ArgumentParser(description="Importação em lote de usuários (ZIP ou pasta + manifesto CSV).")
+    parser.add_argument("source", help="ZIP ou pasta com as imagens")
+    parser.add_argument("--manifest", help="CSV com as colunas name, cellphone, image (padrão: manifest.csv dentro da origem)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos para extrair os encodings")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Usuários gravados por transação")
+    parser.add_argument("--restart", action="store_true", help="Ignora o progresso salvo e recomeça do início")
+    args = parser.parse_args()
+
+    print("--- Importação de Usuários ---")
+    pool = RecognitionPool(size=args.workers)
+    pool.start()
+
+    def progress(report):
+        print(
+            f"{report['processed']}/{report['total']} linhas"
+            f" | criados: {report['created']} | pulados: {report['skipped']} | erros: {report['failed']}"
+        )
+
+    try:
+        report = UserImporter(pool=pool, chunk_size=args.chunk_size, progress=progress).run(
+            args.source, args.manifest, restart=args.restart
+        )
+    except Exception as e:
+        print(f"\n[ERRO] Ocorreu um erro na importação: {e}")
+        sys.exit(1)
+    finally:
+        pool.shutdown()
+
+    for error in report["errors"]:
+        print(f"  linha {error['row']} ({error['cellphone']}): {error['error']}")
+    print(f"\n[SUCESSO] {report['created']} usuários criados, {report['skipped']} já existiam, {report['failed']} com erro.")
+    print("Servidores em execução passam a reconhecer os novos usuários na próxima sincronização da galeria (GALLERY_SYNC_INTERVAL), sem reinício.")
+
+
+if __name__ == "__main__":
+    import_users()
@@ -1,13 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os
-from src.infra.sqlalchemy.database import Base, engine
-from src.infra.sqlalchemy.routes import admin, user, recognition, user_log
+import logging
+from src.infra.sqlalchemy.database import Base, engine, SessionLocal, async_engine
+from src.infra.sqlalchemy.routes import admin, user, recognition, user_log, images, metrics
+from src.infra.sqlalchemy.request_profile import PROFILE_ID_HEADER, profile_id_middleware
+from src.infra.recognition.gallery import gallery
+from src.infra.recognition.workers import recognition_pool
+from src.infra.sqlalchemy.log_writer import log_writer, log_dedup, LOG_WRITER_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega a galeria de rostos na subida para que o primeiro
+    # reconhecimento não pague a leitura da tabela de usuários.
+    db = SessionLocal()
+    try:
+        gallery.ensure_loaded(db)
+    except Exception as e:
+        logger.error(f"Não foi possível pré-carregar a galeria de rostos: {e}")
+    finally:
+        db.close()
+    # Sobe o pool de processos (com os modelos do dlib já carregados)
+    recognition_pool.start()
+    if LOG_WRITER_ENABLED:
+        log_writer.start()
+    yield
+    recognition_pool.shutdown()
+    # Fecha as janelas de de-duplicação e grava o que ainda está na fila
+    log_dedup.flush()
+    log_writer.stop()
+    # Persiste o índice aproximado (se houver) com as alterações feitas em memória
+    gallery.save_index()
+    # Regrava a fotografia da galeria em disco se houver alteração pendente
+    gallery.flush_store()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 
 app = FastAPI(
     title="API de Reconhecimento Facial",
-    description="Backend para gerenciamento de usuários e reconhecimento facial com autenticação JWT para administradores."
+    description="Backend para gerenciamento de usuários e reconhecimento facial com autenticação JWT para administradores.",
+    lifespan=lifespan,
 )
 
 # Rota de teste para a raiz.
@@ -21,18 +57,25 @@ origins = [
     "http://localhost:3001",
 ]
 
+# Id do perfil da requisição (X-Profile) também nas respostas de erro
+app.middleware("http")(profile_id_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeçalhos de resposta que o frontend precisa ler: cursor da próxima página de
+    # /users e /users_log e id do perfil da requisição
+    expose_headers=["X-Next-Cursor", PROFILE_ID_HEADER],
 )
 
-# --- Servir arquivos estáticos ---
-if not os.path.exists("images"):
-    os.makedirs("images")
-app.mount("/images", StaticFiles(directory="images"), name="images")
+# --- Servir as fotos de cadastro (com miniaturas e ETag) ---
+app.include_router(images.router)
+
+# --- Métricas no formato do Prometheus ---
+app.include_router(metrics.router)
 
 
 # --- Inclusão dos Roteadores ---
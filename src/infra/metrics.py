@@ -0,0 +1,300 @@
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Métricas do processo (contadores, medidores e histogramas) no formato de texto
+# do Prometheus. Este módulo só usa a biblioteca padrão para poder ser importado
+# também pelos processos do pool de reconhecimento.
+
+# --- Configuração das métricas ---
+# Mede cada comando SQL e o uso das conexões do pool (eventos do SQLAlchemy)
+METRICS_DB_ENABLED = os.getenv("METRICS_DB_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cada worker do uvicorn tem suas próprias métricas e a coleta cai num worker
+# qualquer; o rótulo `worker` (pid) separa as séries de cada um, para que rate()
+# e os quantis não misturem contadores de processos diferentes. Some no
+# Prometheus, ex.: sum without (worker) (rate(facerec_faces_detected_total[5m])).
+METRICS_WORKER_LABEL = os.getenv("METRICS_WORKER_LABEL", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Limites dos histogramas de tempo, em segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Valor lido na hora da coleta (ex.: profundidade de uma fila), em vez de atualizado a cada evento
+        self.function = function
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"A métrica {self.name} espera os rótulos {self.labelnames}, recebeu {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if METRICS_WORKER_LABEL:
+            # pid lido na coleta: vale também para processos criados por fork depois do import
+            pairs.append(("worker", str(os.getpid())))
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name}{self._labels(())} {_format_value(self.function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in sorted(items)]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+
+class Counter(_Metric):
+    """Valor que só cresce (eventos ocorridos desde a subida do processo)."""
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Contadores só podem ser incrementados.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Valor que sobe e desce (tamanho de fila, conexões em uso...)."""
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribuição de valores (latências) em faixas cumulativas, com soma e contagem."""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Faixa não cumulativa; a soma acumulada é feita só na coleta
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto das métricas do processo, exportado por `render()`."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), function=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Uma função de coleta com erro não derruba a exportação das demais
+                lines.append(f"# Erro ao coletar {metric.name}: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+# Instância única do processo.
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "facerec_stage_seconds", "Tempo de cada etapa do reconhecimento e do cadastro.", ["stage"]
+)
+faces_detected = registry.counter("facerec_faces_detected_total", "Rostos detectados nas imagens de reconhecimento.")
+faces_matched = registry.counter("facerec_faces_matched_total", "Rostos reconhecidos como um usuário cadastrado.")
+faces_unmatched = registry.counter("facerec_faces_unmatched_total", "Rostos detectados sem usuário correspondente.")
+db_query_seconds = registry.histogram(
+    "facerec_db_query_seconds", "Tempo de execução dos comandos SQL.", ["operation"]
+)
+db_connection_hold_seconds = registry.histogram(
+    "facerec_db_connection_hold_seconds", "Tempo entre retirar e devolver uma conexão do pool."
+)
+db_connections_opened = registry.counter("facerec_db_connections_opened_total", "Conexões novas abertas com o banco.")
+
+
+# --- Tempos das etapas ---
+# Dentro de `collect_stages()` (processos do pool) os tempos são guardados e
+# devolvidos junto com o resultado, para serem registrados no processo do servidor.
+_local = threading.local()
+
+
+def record_stage(name: str, seconds: float):
+    collected = getattr(_local, "stages", None)
+    if collected is not None:
+        collected.append((name, seconds))
+    else:
+        stage_seconds.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorador: mede cada chamada da função como a etapa `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_stages():
+    previous = getattr(_local, "stages", None)
+    _local.stages = []
+    try:
+        yield _local.stages
+    finally:
+        _local.stages = previous
+
+
+def observe_stages(stages: Iterable[Tuple[str, float]]):
+    for name, seconds in stages:
+        stage_seconds.observe(seconds, stage=name)
+
+
+def count_faces(detected: int, matched: int):
+    if detected:
+        faces_detected.inc(detected)
+    if matched:
+        faces_matched.inc(matched)
+    if detected > matched:
+        faces_unmatched.inc(detected - matched)
+
+
+# --- Banco de dados ---
+
+def _operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].lower()
+    return operation if operation in ("select", "insert", "update", "delete") else "other"
+
+
+def instrument_engine(engine):
+    """Registra os tempos dos comandos SQL e de uso das conexões do pool da engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            db_query_seconds.observe(time.perf_counter() - starts.pop(), operation=_operation(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        starts = context.connection.info.get("metrics_query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        db_connections_opened.inc()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["metrics_checkout"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("metrics_checkout", None)
+        if start is not None:
+            db_connection_hold_seconds.observe(time.perf_counter() - start)
@@ -0,0 +1,236 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Perfil (cProfile) de requisições isoladas de reconhecimento e cadastro, para
+# investigar quadros lentos em produção. Só usa a biblioteca padrão para poder
+# rodar também nos processos do pool de reconhecimento.
+
+# --- Configuração do profiling ---
+# Fração das requisições perfiladas sem pedido explícito (0 desliga a amostragem)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+# Quantos perfis manter em disco; os mais antigos são apagados
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# Funções listadas no resumo JSON de cada perfil
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "30"))
+
+# Cabeçalho com que um administrador pede o perfil de uma requisição
+PROFILE_HEADER = "X-Profile"
+
+_PROFILE_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+_local = threading.local()
+
+
+def annotate(**values):
+    """Anota dados da requisição perfilada (ex.: tamanho da imagem). Sem perfil ativo, não faz nada."""
+    notes = getattr(_local, "notes", None)
+    if notes is not None:
+        notes.update(values)
+
+
+@contextmanager
+def _collecting_notes(notes: dict):
+    previous = getattr(_local, "notes", None)
+    _local.notes = notes
+    try:
+        yield
+    finally:
+        _local.notes = previous
+
+
+@contextmanager
+def capture():
+    """
+    Perfila o bloco no processo atual (usado nos processos do pool). O dicionário
+    devolvido recebe, na saída, as estatísticas do cProfile e as anotações, que
+    podem ser enviadas ao processo do servidor.
+    """
+    captured = {"stats": {}, "notes": {}}
+    profiler = cProfile.Profile()
+    with _collecting_notes(captured["notes"]):
+        profiler.enable()
+        try:
+            yield captured
+        finally:
+            profiler.disable()
+            profiler.create_stats()
+            captured["stats"] = profiler.stats
+
+
+class _CapturedStats:
+    # Adaptador para pstats: estatísticas vindas de outro processo
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfile:
+    """Perfil de uma requisição: junta o que rodou no servidor e nos processos do pool."""
+
+    def __init__(self, endpoint: str, trigger: str):
+        now = time.time()
+        # Data, hora e milissegundos no início do id: a ordem alfabética é a ordem de criação
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}{uuid.uuid4().hex[:5]}"
+        self.endpoint = endpoint
+        self.trigger = trigger
+        self.notes: dict = {}
+        self.started_at = now
+        self._start = time.perf_counter()
+        self._profiler = cProfile.Profile()
+        self._captures: List[dict] = []
+
+    def call(self, fn, *args, **kwargs):
+        """Executa `fn` perfilando a thread atual."""
+        with _collecting_notes(self.notes):
+            self._profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._profiler.disable()
+
+    def add_capture(self, captured: Optional[dict]):
+        if captured:
+            self._captures.append(captured["stats"])
+            self.notes.update(captured["notes"])
+
+    def stats(self) -> pstats.Stats:
+        self._profiler.create_stats()
+        stats = pstats.Stats()
+        # pstats recusa fontes vazias (ex.: a imagem falhou antes da comparação)
+        for source in [self._profiler.stats] + self._captures:
+            if source:
+                stats.add(_CapturedStats(source))
+        return stats
+
+    def summary(self, stats: pstats.Stats, status: str) -> dict:
+        stats.sort_stats("cumulative")
+        top = []
+        for function in stats.fcn_list[:PROFILE_TOP_FUNCTIONS]:
+            _, calls, total, cumulative, _ = stats.stats[function]
+            filename, line, name = function
+            top.append({
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            })
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "trigger": self.trigger,
+            "status": status,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            **self.notes,
+            "top_functions": top,
+        }
+
+
+def profiled_call(profile: Optional[RequestProfile], fn, *args, **kwargs):
+    """Executa `fn`, perfilando-a se a requisição tiver perfil."""
+    if profile is None:
+        return fn(*args, **kwargs)
+    return profile.call(fn, *args, **kwargs)
+
+
+class ProfileStore:
+    """
+    Anel de perfis em disco: cada perfil gera um `.prof` (abre com pstats ou
+    snakeviz) e um `.json` com o resumo. Só uma requisição é perfilada por vez
+    em cada processo, e só os PROFILE_KEEP perfis mais recentes ficam em disco.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    def start(self, endpoint: str, requested: bool = False) -> Optional[RequestProfile]:
+        """Abre o perfil da requisição se foi pedido ou sorteado. None se não, ou se outro perfil estiver em andamento."""
+        if requested:
+            trigger = "header"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            trigger = "sample"
+        else:
+            return None
+        if not self._busy.acquire(blocking=False):
+            logger.info(f"Perfil de {endpoint} não coletado: outro perfil em andamento neste processo.")
+            return None
+        return RequestProfile(endpoint, trigger)
+
+    def finish(self, profile: RequestProfile, status: str = "ok"):
+        try:
+            self._save(profile, status)
+        except Exception as e:
+            logger.error(f"Erro ao gravar o perfil {profile.id}: {e}")
+        finally:
+            self._busy.release()
+
+    def _save(self, profile: RequestProfile, status: str):
+        os.makedirs(self.directory, exist_ok=True)
+        stats = profile.stats()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        os.close(fd)
+        stats.dump_stats(tmp_path)
+        os.replace(tmp_path, self.path(profile.id, "prof"))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(profile.summary(stats, status), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path(profile.id, "json"))
+        self._cleanup()
+        logger.info(f"Perfil {profile.id} de {profile.endpoint} gravado em {self.directory}.")
+
+    def _cleanup(self):
+        ids = sorted({name.rsplit(".", 1)[0] for name in os.listdir(self.directory) if _PROFILE_ID.match(name.rsplit(".", 1)[0])})
+        for profile_id in ids[:max(0, len(ids) - self.keep)]:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def summaries(self) -> List[dict]:
+        """Resumos dos perfis em disco, do mais recente para o mais antigo (sem a lista de funções)."""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not (name.endswith(".json") and _PROFILE_ID.match(name[:-5])):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop("top_functions", None)
+            summaries.append(summary)
+        return summaries
+
+    def find(self, profile_id: str, extension: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self.path(profile_id, extension)
+        return path if os.path.isfile(path) else None
+
+
+# Instância única do processo.
+profile_store = ProfileStore()
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+# Formato binário do encoding facial armazenado em `users.encoding`:
+#   1 byte com a versão do formato + 128 float32 little-endian (512 bytes).
+ENCODING_SIZE = 128
+ENCODING_DTYPE = np.dtype("<f4")
+ENCODING_FORMAT_V1 = 1
+ENCODING_BYTES = 1 + ENCODING_SIZE * ENCODING_DTYPE.itemsize
+
+
+def encode_face_encoding(encoding: np.ndarray) -> bytes:
+    """Serializa um encoding de 128 dimensões no formato binário versionado."""
+    encoding = np.asarray(encoding, dtype=ENCODING_DTYPE).reshape(-1)
+    if encoding.shape != (ENCODING_SIZE,):
+        raise ValueError(f"encoding com formato inválido: {encoding.shape}")
+    return bytes([ENCODING_FORMAT_V1]) + encoding.tobytes()
+
+
+def decode_face_encoding(raw) -> np.ndarray:
+    """
+    Converte o valor da coluna de volta para um array numpy.
+    O formato binário é lido com `np.frombuffer`, sem cópia (o array é somente leitura).
+    Valores antigos em JSON ainda são aceitos.
+    """
+    if raw is None:
+        raise ValueError("encoding ausente")
+    if isinstance(raw, str):
+        return _decode_legacy_json(raw)
+
+    raw = bytes(raw) if isinstance(raw, memoryview) else raw
+    if raw[:1] == b"[":
+        return _decode_legacy_json(raw)
+    if len(raw) != ENCODING_BYTES or raw[0] != ENCODING_FORMAT_V1:
+        raise ValueError(f"encoding binário inválido (versão {raw[:1]!r}, {len(raw)} bytes)")
+    return np.frombuffer(raw, dtype=ENCODING_DTYPE, count=ENCODING_SIZE, offset=1)
+
+
+def _decode_legacy_json(raw) -> np.ndarray:
+    encoding = np.asarray(json.loads(raw), dtype=ENCODING_DTYPE)
+    if encoding.shape != (ENCODING_SIZE,):
+        raise ValueError(f"encoding com formato inválido: {encoding.shape}")
+    return encoding
@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+# Caixa no formato do face_recognition: (top, right, bottom, left)
+Box = Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class DetectionProfile:
+    """
+    Define como uma imagem é decodificada e onde os rostos são procurados.
+
+    - decode_reduction: 1, 2, 4 ou 8; usa os modos reduzidos do OpenCV
+      (o decodificador JPEG já entrega a imagem em 1/n da resolução).
+    - detect_max_side: se > 0, a detecção roda numa cópia reduzida cujo maior lado
+      tem no máximo esse tamanho; as caixas voltam para a resolução decodificada
+      e os encodings são calculados nela.
+    - upsample: número de upsamples do detector HOG/CNN.
+    """
+    name: str
+    decode_reduction: int = 1
+    detect_max_side: int = 0
+    upsample: int = 1
+    model: str = "hog"
+    num_jitters: int = 1
+
+
+PROFILES: Dict[str, DetectionProfile] = {
+    # Comportamento original: imagem inteira, upsample padrão
+    "accurate": DetectionProfile("accurate"),
+    "balanced": DetectionProfile("balanced", detect_max_side=800, upsample=1),
+    "fast": DetectionProfile("fast", decode_reduction=2, detect_max_side=480, upsample=1),
+}
+
+# Perfil usado no reconhecimento e no cadastro, escolhido por implantação
+DETECTION_PROFILE = os.getenv("DETECTION_PROFILE", "accurate")
+ENROLLMENT_DETECTION_PROFILE = os.getenv("ENROLLMENT_DETECTION_PROFILE", DETECTION_PROFILE)
+
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def get_profile(name: Optional[str] = None) -> DetectionProfile:
+    name = name or DETECTION_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Perfil de detecção desconhecido: {name}")
+    return PROFILES[name]
+
+
+def decode_bgr(image_file_content: bytes, reduction: int = 1) -> Optional[np.ndarray]:
+    np_image = np.frombuffer(image_file_content, np.uint8)
+    return cv2.imdecode(np_image, _REDUCED_DECODE_FLAGS.get(reduction, cv2.IMREAD_COLOR))
+
+
+def locate_faces(image_bgr: np.ndarray, profile: DetectionProfile) -> Tuple[List[Box], Optional[np.ndarray]]:
+    """
+    Detecta os rostos segundo o perfil. Devolve as caixas na resolução de
+    `image_bgr` e, quando a detecção já rodou nela, a imagem RGB para reaproveitar.
+    """
+    height, width = image_bgr.shape[:2]
+    scale = 1.0
+    if profile.detect_max_side and max(height, width) > profile.detect_max_side:
+        scale = profile.detect_max_side / max(height, width)
+
+    if scale == 1.0:
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        return face_recognition.face_locations(image_rgb, profile.upsample, profile.model), image_rgb
+
+    small_bgr = cv2.resize(image_bgr, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    small_rgb = cv2.cvtColor(small_bgr, cv2.COLOR_BGR2RGB)
+    boxes = [
+        (
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale)),
+        )
+        for top, right, bottom, left in face_recognition.face_locations(small_rgb, profile.upsample, profile.model)
+    ]
+    return boxes, None
+
+
+def box_iou(a: Box, b: Box) -> float:
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def evaluate_profiles(images: List[bytes], reference: str = "accurate") -> Dict[str, dict]:
+    """
+    Mede cada perfil sobre um conjunto de imagens: latência (decodificação +
+    detecção) e recall em relação aos rostos encontrados pelo perfil de referência.
+    """
+    reference_profile = get_profile(reference)
+    reference_boxes = []
+    for content in images:
+        image = decode_bgr(content, reference_profile.decode_reduction)
+        reference_boxes.append(locate_faces(image, reference_profile)[0] if image is not None else [])
+
+    report = {}
+    for name, profile in PROFILES.items():
+        latencies, found, expected, detected = [], 0, 0, 0
+        for content, expected_boxes in zip(images, reference_boxes):
+            start = time.perf_counter()
+            image = decode_bgr(content, profile.decode_reduction)
+            boxes = locate_faces(image, profile)[0] if image is not None else []
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            # Leva as caixas para a escala da referência antes de comparar
+            factor = profile.decode_reduction / reference_profile.decode_reduction
+            boxes = [tuple(int(v * factor) for v in box) for box in boxes]
+            expected += len(expected_boxes)
+            detected += len(boxes)
+            found += sum(1 for ref in expected_boxes if any(box_iou(ref, box) >= 0.5 for box in boxes))
+
+        report[name] = {
+            "images": len(images),
+            "latency_ms_mean": float(np.mean(latencies)) if latencies else 0.0,
+            "latency_ms_p95": float(np.percentile(latencies, 95)) if latencies else 0.0,
+            "faces_detected": detected,
+            "recall": found / expected if expected else 1.0,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # Uso: python -m src.infra.recognition.detection <pasta com imagens>
+    directory = sys.argv[1] if len(sys.argv) > 1 else "images"
+    files = sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    contents = []
+    for path in files:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    print(f"{len(contents)} imagens em {directory}")
+    for name, stats in evaluate_profiles(contents).items():
+        print(
+            f"{name:>10}: {stats['latency_ms_mean']:8.1f} ms (p95 {stats['latency_ms_p95']:8.1f} ms)"
+            f"  rostos={stats['faces_detected']:4d}  recall={stats['recall']:.3f}"
+        )
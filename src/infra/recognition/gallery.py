@@ -0,0 +1,743 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+from src.infra.sqlalchemy.database import SessionLocal
+from src.infra.sqlalchemy.models.user import User
+from src.infra.sqlalchemy.models.user_encoding import UserEncoding
+from src.infra.sqlalchemy.repositories.gallery_change import GalleryChangeRepository
+from src.infra.recognition.codec import ENCODING_SIZE, decode_face_encoding
+from src.infra.recognition.matcher import FaceMatch, match_candidates, match_faces, squared_norms
+from src.infra.recognition.index import FACE_INDEX_PATH, FACE_INDEX_RERANK, create_index
+from src.infra.recognition.templates import TEMPLATE_MAX_SAMPLES, build_template, row_key
+from src.infra.recognition.snapshot_store import GALLERY_SNAPSHOT_DEBOUNCE_SECONDS, SnapshotStore, create_snapshot_store
+
+# Configuração do logger
+logger = logging.getLogger(__name__)
+
+# Intervalo entre consultas à versão global da galeria (alterações feitas por outros workers/réplicas)
+GALLERY_SYNC_INTERVAL = float(os.getenv("GALLERY_SYNC_INTERVAL", "2"))
+# Os ids de gallery_changes são reservados no INSERT, não no commit: um id menor
+# pode aparecer depois de um maior. A versão só avança até a primeira lacuna; uma
+# lacuna que dura mais que GALLERY_CHANGE_GAP_SECONDS é tratada como descartada
+# (rollback). Na carga a partir do banco, as últimas GALLERY_CHANGE_WINDOW
+# alterações são conferidas da mesma forma.
+GALLERY_CHANGE_GAP_SECONDS = float(os.getenv("GALLERY_CHANGE_GAP_SECONDS", "300"))
+GALLERY_CHANGE_WINDOW = int(os.getenv("GALLERY_CHANGE_WINDOW", "1000"))
+# gallery_changes é podado depois de cada regravação: ficam as alterações dos últimos
+# GALLERY_CHANGE_GAP_SECONDS + GALLERY_CHANGE_RETENTION_SECONDS. Um worker (ou uma
+# fotografia em disco) mais atrasado que isso relê a galeria inteira do banco.
+GALLERY_CHANGE_RETENTION_SECONDS = float(os.getenv("GALLERY_CHANGE_RETENTION_SECONDS", "3600"))
+
+
+@dataclass(frozen=True)
+class GallerySnapshot:
+    """
+    Fotografia imutável da galeria. Quem faz o reconhecimento pega uma referência
+    e trabalha sobre ela sem lock; as alterações criam uma nova fotografia.
+
+    Cada usuário ocupa até TEMPLATE_MAX_SAMPLES linhas (o template de suas amostras);
+    `ids` e os metadados são por linha, então uma linha já identifica o usuário.
+    """
+    ids: np.ndarray  # int64 (N,), id do usuário de cada linha
+    keys: np.ndarray  # int64 (N,), chave da linha (usuário + posição no template), usada pelo índice
+    names: List[str]
+    cellphones: List[str]
+    image_paths: List[str]
+    encodings: np.ndarray  # float32 (N, 128), contíguo
+    sq_norms: np.ndarray  # float32 (N,), normas pré-calculadas para o matcher
+    row_of: Dict[int, int] = field(default_factory=dict)  # usuário -> primeira linha
+    row_of_key: Dict[int, int] = field(default_factory=dict)
+    # Versão global (id em gallery_changes) até onde esta fotografia está em dia,
+    # sem lacunas, e alterações acima dela que já estão aplicadas
+    version: int = 0
+    ahead: FrozenSet[int] = frozenset()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def user_count(self) -> int:
+        return len(self.row_of)
+
+    @classmethod
+    def empty(cls) -> "GallerySnapshot":
+        return cls(
+            ids=np.empty(0, dtype=np.int64),
+            keys=np.empty(0, dtype=np.int64),
+            names=[],
+            cellphones=[],
+            image_paths=[],
+            encodings=np.empty((0, ENCODING_SIZE), dtype=np.float32),
+            sq_norms=np.empty(0, dtype=np.float32),
+        )
+
+    @classmethod
+    def build(cls, ids, keys, names, cellphones, image_paths, encodings, version: int = 0, ahead=frozenset()) -> "GallerySnapshot":
+        ids = np.asarray(ids, dtype=np.int64)
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(encodings):
+            matrix = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+        else:
+            matrix = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        row_of = {}
+        for row, user_id in enumerate(ids.tolist()):
+            row_of.setdefault(user_id, row)
+        return cls(
+            ids=ids,
+            keys=keys,
+            names=list(names),
+            cellphones=list(cellphones),
+            image_paths=list(image_paths),
+            encodings=matrix,
+            sq_norms=squared_norms(matrix),
+            row_of=row_of,
+            row_of_key={key: row for row, key in enumerate(keys.tolist())},
+            version=version,
+            ahead=frozenset(ahead),
+        )
+
+    @classmethod
+    def from_arrays(cls, ids, keys, encodings, sq_norms, users: Dict[int, list], version: int = 0, ahead=frozenset()) -> "GallerySnapshot":
+        """Monta a fotografia sobre arrays já prontos (mapeados do disco), sem copiá-los."""
+        names, cellphones, image_paths = [], [], []
+        for user_id in ids.tolist():
+            name, cellphone, image_path = users[user_id]
+            names.append(name)
+            cellphones.append(cellphone)
+            image_paths.append(image_path)
+        row_of = {}
+        for row, user_id in enumerate(ids.tolist()):
+            row_of.setdefault(user_id, row)
+        return cls(
+            ids=ids,
+            keys=keys,
+            names=names,
+            cellphones=cellphones,
+            image_paths=image_paths,
+            encodings=encodings,
+            sq_norms=sq_norms,
+            row_of=row_of,
+            row_of_key={key: row for row, key in enumerate(keys.tolist())},
+            version=version,
+            ahead=frozenset(ahead),
+        )
+
+
+def _index_changes(previous: GallerySnapshot, snapshot: GallerySnapshot) -> List[Tuple[int, Optional[np.ndarray]]]:
+    """Alterações (chave, vetor ou None para remover) que levam o índice de `previous` para `snapshot`."""
+    removed = np.setdiff1d(previous.keys, snapshot.keys, assume_unique=True)
+    _, old_rows, new_rows = np.intersect1d(previous.keys, snapshot.keys, assume_unique=True, return_indices=True)
+    changed = new_rows[np.any(previous.encodings[old_rows] != snapshot.encodings[new_rows], axis=1)]
+    added = np.flatnonzero(~np.isin(snapshot.keys, previous.keys, assume_unique=True))
+    rows = np.concatenate([changed, added])
+    return [(int(key), None) for key in removed.tolist()] + [
+        (int(snapshot.keys[row]), np.asarray(snapshot.encodings[row])) for row in rows.tolist()
+    ]
+
+
+def _template_rows(user_id: int, samples) -> Tuple[np.ndarray, List[int]]:
+    template = build_template(samples)
+    return template, [row_key(user_id, slot) for slot in range(len(template))]
+
+
+class FaceGallery:
+    """
+    Galeria de rostos residente em memória, compartilhada pelo processo inteiro.
+
+    É carregada do banco uma única vez e depois mantida em dia pelas operações do
+    UserRepository (criação, atualização e remoção), de modo que o reconhecimento
+    nunca precisa ler a tabela `users`. Alterações feitas por outros workers ou
+    réplicas chegam pelo registro `gallery_changes`: a cada GALLERY_SYNC_INTERVAL
+    a galeria consulta a versão global e relê só os usuários alterados.
+
+    Com uma SnapshotStore, a galeria é mapeada de uma fotografia em disco
+    compartilhada pelos workers: só o primeiro lê o banco, os demais mapeiam os
+    mesmos arquivos. Depois de uma alteração, a fotografia é regravada (com
+    debounce) e os workers passam a mapear a nova geração.
+
+    O índice aproximado (FACE_INDEX) é montado em segundo plano, num objeto novo
+    que só substitui o atual quando fica pronto; enquanto isso a busca usa o
+    índice anterior, ou a busca exaustiva se ainda não houver nenhum. Ao passar
+    para uma geração nova da fotografia, o índice recebe só as diferenças.
+
+    Limitação: a fotografia em disco compartilha só os encodings da busca exata.
+    O índice IVF guarda em cada worker uma cópia própria dos vetores nas suas
+    listas, então com FACE_INDEX=ivf a memória por worker cresce com a galeria.
+    """
+
+    def __init__(self, index=None, store: Optional[SnapshotStore] = None):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[GallerySnapshot] = None
+        # Índice aproximado opcional (FACE_INDEX); None = busca exaustiva
+        self._index_template = index
+        self._index = None
+        # Alterações feitas enquanto um índice novo é montado: (chave, vetor ou None para remover)
+        self._index_pending: Optional[list] = None
+        # Montagem pedida durante outra (None = nenhuma; senão, se deve ignorar o índice salvo)
+        self._index_requested: Optional[bool] = None
+        self._index_idle = threading.Event()
+        self._index_idle.set()
+        self._store = store
+        self._generation: Optional[int] = None
+        self._rebuild_timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0.0
+        # Lacunas na sequência de gallery_changes: primeiro id ausente -> quando foi vista
+        self._gaps: Dict[int, float] = {}
+        # Alterações locais (upsert/remove) ainda sem versão: a fotografia em disco pode
+        # não tê-las, mesmo com versão igual. Só a sincronização em _rebuild_store limpa.
+        self._unsynced = False
+        # (quando, versão) confirmadas por sync, para saber até onde podar gallery_changes
+        self._versions_seen: Deque[Tuple[float, int]] = deque()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        return self.snapshot().version
+
+    def snapshot(self) -> GallerySnapshot:
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None else GallerySnapshot.empty()
+
+    def ensure_loaded(self, db: Session) -> GallerySnapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._open(db)
+                    self._refresh_index(self._snapshot)
+            # A fotografia em disco pode estar algumas versões atrás
+            self.sync(db, force=True)
+        else:
+            self._follow_store()
+            self.sync(db)
+        return self._snapshot
+
+    def reload(self, db: Session) -> GallerySnapshot:
+        with self._lock:
+            self._snapshot = self._load_from_db(db)
+            self._unsynced = False
+            if self._store is not None:
+                with self._store.lock():
+                    self._generation = self._write_store(self._snapshot)
+            self._refresh_index(self._snapshot, rebuild=True)
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _fetch_users(self, db: Session, user_ids: Optional[List[int]] = None) -> List[Tuple[object, List[np.ndarray]]]:
+        """Lê os usuários (todos ou só `user_ids`) com todas as suas amostras decodificadas."""
+        users_query = db.query(User.id, User.name, User.cellphone, User.image_path, User.encoding)
+        samples_query = db.query(UserEncoding.user_id, UserEncoding.encoding).order_by(UserEncoding.user_id, UserEncoding.id)
+        if user_ids is not None:
+            users_query = users_query.filter(User.id.in_(user_ids))
+            samples_query = samples_query.filter(UserEncoding.user_id.in_(user_ids))
+
+        # Amostras extras, agrupadas por usuário
+        extra_samples: Dict[int, list] = {}
+        for sample in samples_query:
+            try:
+                extra_samples.setdefault(sample.user_id, []).append(decode_face_encoding(sample.encoding))
+            except (TypeError, ValueError) as e:
+                logger.error(f"Erro ao decodificar amostra de encoding do usuário {sample.user_id}: {e}. Ignorando.")
+
+        users = []
+        for row in users_query:
+            try:
+                samples = [decode_face_encoding(row.encoding)] + extra_samples.get(row.id, [])
+            except (TypeError, ValueError) as e:
+                logger.error(f"Erro ao decodificar encoding para o usuário {row.name} (ID: {row.id}): {e}. Ignorando.")
+                continue
+            users.append((row, samples))
+        return users
+
+    def _load_from_db(self, db: Session) -> GallerySnapshot:
+        # A versão é lida antes dos usuários: alterações feitas durante a leitura
+        # são aplicadas de novo na próxima sincronização (aplicar é idempotente).
+        # Alterações ainda não confirmadas nas últimas GALLERY_CHANGE_WINDOW seguram a versão.
+        changes = GalleryChangeRepository(db)
+        # Até a marca da poda tudo já está na tabela `users`
+        base = max(changes.pruned_through(), changes.current_version() - GALLERY_CHANGE_WINDOW)
+        change_ids = [change_id for change_id, _ in changes.changes_after(base)]
+        version = self._committed_version(base, change_ids)
+        ahead = [change_id for change_id in change_ids if change_id > version]
+
+        ids, keys, names, cellphones, image_paths, encodings = [], [], [], [], [], []
+        users = self._fetch_users(db)
+        for row, samples in users:
+            template, template_keys = _template_rows(row.id, samples)
+            ids.extend([row.id] * len(template))
+            keys.extend(template_keys)
+            names.extend([row.name] * len(template))
+            cellphones.extend([row.cellphone] * len(template))
+            image_paths.extend([row.image_path] * len(template))
+            encodings.append(template)
+
+        logger.info(f"Galeria de rostos carregada com {len(users)} usuários ({len(ids)} linhas), versão {version}.")
+        return GallerySnapshot.build(ids, keys, names, cellphones, image_paths, encodings, version=version, ahead=ahead)
+
+    # --- Sincronização entre workers e réplicas ---
+
+    def sync(self, db: Session, force: bool = False) -> bool:
+        """
+        Aplica as alterações registradas por outros processos desde a versão atual.
+        Custa uma consulta a MAX(id) por intervalo; só os usuários alterados são relidos.
+        Alterações acima de uma lacuna são aplicadas, mas a versão fica antes da
+        lacuna até o id ausente aparecer (commit atrasado) ou o prazo acabar.
+        Devolve True se a sincronização rodou até o fim.
+        """
+        if self._snapshot is None:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return False
+        if not self._sync_lock.acquire(blocking=force):
+            return False
+        try:
+            self._next_sync = now + GALLERY_SYNC_INTERVAL
+            changes = GalleryChangeRepository(db)
+            snapshot = self.snapshot()
+            if changes.current_version() <= snapshot.version:
+                return True
+            pruned_through = changes.pruned_through()
+            if snapshot.version < pruned_through - 1:
+                # As alterações entre a versão daqui e a marca da poda não existem mais
+                logger.warning(
+                    f"Galeria na versão {snapshot.version}, mas gallery_changes foi podado até "
+                    f"{pruned_through}; relendo todos os usuários do banco."
+                )
+                self.reload(db)
+                self._observe_version(now, self.version)
+                return True
+            rows = changes.changes_after(snapshot.version)
+            new_version = self._committed_version(snapshot.version, [change_id for change_id, _ in rows])
+            user_ids = list(dict.fromkeys(user_id for change_id, user_id in rows if change_id not in snapshot.ahead))
+            users = self._fetch_users(db, user_ids) if user_ids else []
+            present = {row.id for row, _ in users}
+            ahead = [change_id for change_id, _ in rows if change_id > new_version]
+            self._apply(users, [user_id for user_id in user_ids if user_id not in present], version=new_version, ahead=ahead)
+            self._observe_version(now, new_version)
+            if user_ids:
+                logger.info(f"Galeria sincronizada até a versão {new_version}: {len(user_ids)} usuários alterados.")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar a galeria de rostos: {e}")
+            return False
+        finally:
+            self._sync_lock.release()
+
+    def _observe_version(self, now: float, version: int):
+        seen = self._versions_seen
+        if not seen or seen[-1][1] < version:
+            seen.append((now, version))
+        # Basta a observação mais nova que já passou do horizonte da poda
+        horizon = now - (GALLERY_CHANGE_GAP_SECONDS + GALLERY_CHANGE_RETENTION_SECONDS)
+        while len(seen) > 1 and seen[1][0] <= horizon:
+            seen.popleft()
+
+    def _prune_changes(self, db: Session):
+        """
+        Apaga de gallery_changes o que já estava confirmado (versão vista por sync) há
+        mais de GALLERY_CHANGE_GAP_SECONDS + GALLERY_CHANGE_RETENTION_SECONDS.
+        """
+        horizon = time.monotonic() - (GALLERY_CHANGE_GAP_SECONDS + GALLERY_CHANGE_RETENTION_SECONDS)
+        seen = self._versions_seen
+        if not seen or seen[0][0] > horizon:
+            return
+        through = seen[0][1]
+        deleted = GalleryChangeRepository(db).prune(through)
+        db.commit()
+        if deleted:
+            logger.info(f"{deleted} alterações antigas da galeria apagadas de gallery_changes (até a {through}).")
+
+    def _committed_version(self, version: int, change_ids: List[int]) -> int:
+        """
+        Maior versão a partir de `version` sem ids faltando em `change_ids` (em
+        ordem). Uma lacuna só é pulada depois de GALLERY_CHANGE_GAP_SECONDS.
+        """
+        now = time.monotonic()
+        for change_id in change_ids:
+            if change_id > version + 1:
+                seen_at = self._gaps.setdefault(version + 1, now)
+                if now - seen_at < GALLERY_CHANGE_GAP_SECONDS:
+                    break
+                logger.warning(
+                    f"Alterações {version + 1} a {change_id - 1} da galeria não apareceram em "
+                    f"{GALLERY_CHANGE_GAP_SECONDS:.0f}s; consideradas descartadas."
+                )
+            version = change_id
+        self._gaps = {gap: seen_at for gap, seen_at in self._gaps.items() if gap > version}
+        return version
+
+    # --- Fotografia compartilhada em disco ---
+
+    def _open(self, db: Session) -> GallerySnapshot:
+        if self._store is None:
+            return self._load_from_db(db)
+        snapshot = self._load_from_store()
+        if snapshot is not None:
+            return snapshot
+        with self._store.lock():
+            # Outro worker pode ter gravado a fotografia enquanto este esperava o lock
+            snapshot = self._load_from_store()
+            if snapshot is not None:
+                return snapshot
+            self._write_store(self._load_from_db(db))
+        return self._load_from_store() or self._load_from_db(db)
+
+    def _load_from_store(self) -> Optional[GallerySnapshot]:
+        loaded = self._store.load()
+        if loaded is None:
+            return None
+        generation, arrays, meta = loaded
+        if "version" not in meta:
+            # Fotografia sem versão: não dá para saber quais alterações aplicar
+            return None
+        users = {int(user_id): values for user_id, values in meta["users"].items()}
+        snapshot = GallerySnapshot.from_arrays(
+            arrays["ids"], arrays["keys"], arrays["encodings"], arrays["sq_norms"], users,
+            version=int(meta["version"]), ahead=meta.get("ahead", []),
+        )
+        self._generation = generation
+        logger.info(
+            f"Galeria de rostos mapeada da fotografia em disco (geração {generation}, versão {snapshot.version}, {len(users)} usuários)."
+        )
+        return snapshot
+
+    def _write_store(self, snapshot: GallerySnapshot) -> int:
+        users = {}
+        for row in snapshot.row_of.values():
+            users[int(snapshot.ids[row])] = [snapshot.names[row], snapshot.cellphones[row], snapshot.image_paths[row]]
+        return self._store.write(
+            {"ids": snapshot.ids, "keys": snapshot.keys, "encodings": snapshot.encodings, "sq_norms": snapshot.sq_norms},
+            {"version": snapshot.version, "ahead": sorted(snapshot.ahead), "users": users},
+        )
+
+    def _follow_store(self):
+        """Passa a mapear a geração nova quando outro worker regravou a fotografia."""
+        if self._store is None or not self._store.due():
+            return
+        generation = self._store.current_generation()
+        if generation is None or generation == self._generation:
+            return
+        snapshot = self._load_from_store()
+        if snapshot is None:
+            # Geração ilegível: não tenta de novo até o ponteiro mudar
+            self._generation = generation
+            return
+        with self._lock:
+            # Só troca se a geração nova tiver tudo o que já foi aplicado aqui. Com
+            # alterações locais ainda não sincronizadas nem uma versão igual basta: a
+            # geração pode ser a que este worker gravou antes de remover um usuário.
+            # A geração recusada fica registrada em _generation (por _load_from_store),
+            # para não ser relida a cada verificação até sair uma geração mais nova.
+            if self._unsynced or not self._covers(snapshot, self._snapshot):
+                return
+            previous, self._snapshot = self._snapshot, snapshot
+            self._refresh_index(snapshot, previous=previous)
+
+    @staticmethod
+    def _covers(candidate: GallerySnapshot, current: Optional[GallerySnapshot]) -> bool:
+        """True se `candidate` tem todas as alterações de gallery_changes aplicadas em `current`."""
+        if current is None:
+            return True
+        if candidate.version < current.version:
+            return False
+        return all(change_id <= candidate.version or change_id in candidate.ahead for change_id in current.ahead)
+
+    def _schedule_store_rebuild(self):
+        with self._timer_lock:
+            if self._rebuild_timer is not None:
+                return
+            self._rebuild_timer = threading.Timer(GALLERY_SNAPSHOT_DEBOUNCE_SECONDS, self._rebuild_store)
+            self._rebuild_timer.daemon = True
+            self._rebuild_timer.start()
+
+    def flush_store(self):
+        """Grava já uma regravação pendente (usado na parada do servidor)."""
+        with self._timer_lock:
+            timer, self._rebuild_timer = self._rebuild_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._rebuild_store()
+
+    def _rebuild_store(self):
+        """
+        Regrava a fotografia a partir da galeria em memória, já sincronizada com o
+        registro de alterações (sem reler a tabela `users`), e poda gallery_changes
+        (também sem fotografia em disco). Se outro worker já gravou uma versão
+        igual ou mais nova, a fotografia não é regravada.
+        """
+        with self._timer_lock:
+            self._rebuild_timer = None
+        db = SessionLocal()
+        try:
+            if self._store is not None:
+                self._write_synced_store(db)
+            self._prune_changes(db)
+        except Exception as e:
+            logger.error(f"Erro ao regravar a fotografia da galeria: {e}")
+        finally:
+            db.close()
+
+    def _write_synced_store(self, db: Session):
+        # Limpo antes de sincronizar: uma alteração local feita durante a regravação
+        # marca de novo. A sessão é nova, então vê tudo o que já foi confirmado.
+        with self._lock:
+            self._unsynced = False
+        if not self.sync(db, force=True):
+            self._mark_unsynced()
+            return
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        with self._store.lock():
+            stored = self._store.load()
+            if stored is not None and stored[2].get("version", -1) >= snapshot.version:
+                return
+            self._generation = self._write_store(snapshot)
+
+    def _mark_unsynced(self):
+        """Alteração local sem versão: segura a troca de geração até a próxima regravação."""
+        with self._lock:
+            self._unsynced = True
+        self._schedule_store_rebuild()
+
+    # --- Índice aproximado ---
+
+    def _refresh_index(self, snapshot: GallerySnapshot, rebuild: bool = False, previous: Optional[GallerySnapshot] = None):
+        """
+        Agenda a atualização do índice para `snapshot` numa thread (o k-means não roda
+        no caminho da requisição nem com o lock da galeria). Com `previous` (troca
+        de fotografia), o índice atual recebe só as diferenças entre as duas em vez
+        de ser montado de novo. Chamar com self._lock.
+        """
+        if self._index_template is None:
+            return
+        if self._index_pending is not None:
+            # Já há uma montagem em andamento: ao terminar, ela recomeça da fotografia atual
+            self._index_requested = bool(self._index_requested) or rebuild
+            return
+        self._index_pending = []
+        self._index_idle.clear()
+        if previous is not None and self._index is not None and not rebuild:
+            target, args = self._update_index, (previous, snapshot)
+        else:
+            target, args = self._build_index, (snapshot, rebuild)
+        threading.Thread(target=target, args=args, name="face-index", daemon=True).start()
+
+    def _build_index(self, snapshot: GallerySnapshot, rebuild: bool):
+        index = self._index_template.empty_copy()
+        loaded = False
+        try:
+            loaded = not rebuild and index.load(FACE_INDEX_PATH, snapshot.keys, snapshot.encodings) and not index.needs_rebuild()
+            if not loaded:
+                index.build(snapshot.keys, snapshot.encodings)
+        except Exception as e:
+            logger.error(f"Erro ao montar o índice de rostos: {e}")
+            index = None
+        with self._lock:
+            if index is not None:
+                self._index = index
+            self._finish_index_update([])
+        if index is not None and not loaded:
+            self.save_index()
+
+    def _update_index(self, previous: GallerySnapshot, snapshot: GallerySnapshot):
+        try:
+            changes = _index_changes(previous, snapshot)
+        except Exception as e:
+            logger.error(f"Erro ao comparar as fotografias da galeria para o índice: {e}")
+            changes = None
+        with self._lock:
+            if changes is None:
+                # Sem a diferença, monta o índice de novo a partir da fotografia atual
+                self._index_requested = True
+            self._finish_index_update(changes or [])
+
+    def _finish_index_update(self, changes: list):
+        # Aplica as diferenças e depois as alterações feitas na galeria enquanto a thread rodava
+        if self._index is not None:
+            for key, vector in changes + self._index_pending:
+                if vector is None:
+                    self._index.remove(key)
+                else:
+                    self._index.add(key, vector)
+        self._index_pending = None
+        requested, self._index_requested = self._index_requested, None
+        if requested is not None and self._snapshot is not None:
+            self._refresh_index(self._snapshot, rebuild=requested)
+        else:
+            self._index_idle.set()
+
+    def wait_index(self, timeout: Optional[float] = None) -> bool:
+        """Espera as montagens do índice em andamento terminarem (benchmarks e parada do servidor)."""
+        return self._index_idle.wait(timeout)
+
+    def _index_add(self, key: int, vector: np.ndarray):
+        if self._index is not None:
+            self._index.add(key, vector)
+        if self._index_pending is not None:
+            self._index_pending.append((key, vector))
+
+    def _index_remove(self, key: int):
+        if self._index is not None:
+            self._index.remove(key)
+        if self._index_pending is not None:
+            self._index_pending.append((key, None))
+
+    def save_index(self):
+        index = self._index
+        if index is None or self._snapshot is None:
+            return
+        try:
+            index.save(FACE_INDEX_PATH)
+        except OSError as e:
+            logger.error(f"Não foi possível salvar o índice de rostos em {FACE_INDEX_PATH}: {e}")
+
+    def match(self, queries, tolerance: float, top_k: int = 0) -> Tuple[GallerySnapshot, List[FaceMatch]]:
+        """
+        Busca os rostos na galeria. Sem índice a busca é exaustiva; com índice ele
+        sugere FACE_INDEX_RERANK candidatos por rosto e a distância final é exata.
+        Os candidatos (top_k) são usuários distintos, cada um com sua linha mais próxima.
+        """
+        snapshot = self.snapshot()
+        index = self._index
+        # Um usuário ocupa várias linhas: busca linhas suficientes para k usuários distintos
+        row_k = top_k * TEMPLATE_MAX_SAMPLES if top_k else 0
+        if index is None or len(snapshot) == 0:
+            matches = match_faces(queries, snapshot.encodings, snapshot.sq_norms, tolerance, top_k=row_k)
+        else:
+            candidate_keys = index.search(queries, max(FACE_INDEX_RERANK, row_k))
+            candidate_rows = [
+                np.array([snapshot.row_of_key[int(key)] for key in keys if int(key) in snapshot.row_of_key], dtype=np.int64)
+                for keys in candidate_keys
+            ]
+            matches = match_candidates(queries, snapshot.encodings, candidate_rows, tolerance, top_k=row_k)
+
+        if top_k:
+            for match in matches:
+                match.candidates = self._distinct_users(snapshot, match.candidates, top_k)
+        return snapshot, matches
+
+    @staticmethod
+    def _distinct_users(snapshot: GallerySnapshot, candidates: List[Tuple[int, float]], top_k: int) -> List[Tuple[int, float]]:
+        seen, distinct = set(), []
+        for row, distance in candidates:
+            user_id = int(snapshot.ids[row])
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            distinct.append((row, distance))
+            if len(distinct) == top_k:
+                break
+        return distinct
+
+    # --- Atualizações em memória ---
+    # Se a galeria ainda não foi carregada não há nada a fazer: o próximo
+    # carregamento já vai ler o estado confirmado no banco.
+
+    def upsert(self, user: User, samples: np.ndarray):
+        """Inclui o usuário ou troca seu template, calculado a partir de todas as suas amostras."""
+        self.upsert_many([user], [samples])
+
+    def upsert_many(self, users: List[User], samples: List[np.ndarray]):
+        """Inclui ou atualiza vários usuários com uma única cópia da galeria (importação em lote)."""
+        self._apply(list(zip(users, samples)), [])
+
+    def _apply(self, upserts: list, removed: List[int], version: Optional[int] = None, ahead=()):
+        """
+        Troca as linhas dos usuários em `upserts` (pares usuário, amostras) pelo
+        template novo e tira os usuários em `removed`, numa única cópia da galeria.
+        `version` e `ahead` vêm da sincronização com gallery_changes.
+        """
+        if not upserts and not removed and version is None:
+            return
+        templates = [_template_rows(user.id, user_samples) for user, user_samples in upserts]
+        with self._lock:
+            current = self._snapshot
+            if current is None:
+                return
+            new_version = max(current.version, version or 0)
+            new_ahead = frozenset(change_id for change_id in current.ahead.union(ahead) if change_id > new_version)
+            if not upserts and not removed:
+                self._snapshot = replace(current, version=new_version, ahead=new_ahead)
+                return
+            # As linhas antigas dos usuários saem e o template novo entra no fim
+            keep = ~np.isin(current.ids, [user.id for user, _ in upserts] + list(removed))
+            old_keys = current.keys[~keep]
+            ids = [current.ids[keep]]
+            keys = [current.keys[keep]]
+            names = [name for name, kept in zip(current.names, keep) if kept]
+            cellphones = [cellphone for cellphone, kept in zip(current.cellphones, keep) if kept]
+            image_paths = [image_path for image_path, kept in zip(current.image_paths, keep) if kept]
+            encodings = [current.encodings[keep]]
+            for (user, _), (template, template_keys) in zip(upserts, templates):
+                ids.append(np.full(len(template), user.id, dtype=np.int64))
+                keys.append(np.asarray(template_keys, dtype=np.int64))
+                names.extend([user.name] * len(template))
+                cellphones.extend([user.cellphone] * len(template))
+                image_paths.extend([user.image_path] * len(template))
+                encodings.append(template)
+            self._snapshot = GallerySnapshot.build(
+                np.concatenate(ids), np.concatenate(keys), names, cellphones, image_paths, encodings,
+                version=new_version, ahead=new_ahead,
+            )
+
+            if self._index_template is not None:
+                for key in old_keys.tolist():
+                    self._index_remove(key)
+                for template, template_keys in templates:
+                    for key, vector in zip(template_keys, template):
+                        self._index_add(key, vector)
+                if self._index is not None and self._index_pending is None and self._index.needs_rebuild():
+                    self._refresh_index(self._snapshot, rebuild=True)
+            if version is None:
+                self._unsynced = True
+        self._schedule_store_rebuild()
+
+    def update_metadata(self, user: User):
+        with self._lock:
+            current = self._snapshot
+            if current is None or user.id not in current.row_of:
+                return
+            names, cellphones, image_paths = list(current.names), list(current.cellphones), list(current.image_paths)
+            for row in np.flatnonzero(current.ids == user.id).tolist():
+                names[row], cellphones[row], image_paths[row] = user.name, user.cellphone, user.image_path
+            self._snapshot = GallerySnapshot(
+                ids=current.ids,
+                keys=current.keys,
+                names=names,
+                cellphones=cellphones,
+                image_paths=image_paths,
+                encodings=current.encodings,
+                sq_norms=current.sq_norms,
+                row_of=current.row_of,
+                row_of_key=current.row_of_key,
+                version=current.version,
+                ahead=current.ahead,
+            )
+            self._unsynced = True
+        self._schedule_store_rebuild()
+
+    def remove(self, user_id: int):
+        if user_id in self.snapshot().row_of:
+            self._apply([], [user_id])
+
+
+# Instância única do processo.
+gallery = FaceGallery(index=create_index(), store=create_snapshot_store())
@@ -0,0 +1,278 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.infra.recognition.matcher import squared_distance_matrix, squared_norms
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do índice ---
+# FACE_INDEX=exact mantém a busca exaustiva; FACE_INDEX=ivf ativa o índice aproximado.
+# O IVF não é compartilhado entre os workers: cada um mantém suas listas, com uma
+# cópia dos vetores (~512 bytes por amostra), além da fotografia mapeada em disco.
+FACE_INDEX = os.getenv("FACE_INDEX", "exact").lower()
+FACE_INDEX_PATH = os.getenv("FACE_INDEX_PATH", "data/face_index.npz")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = automático (~4 * sqrt(N))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "5000"))
+# Quantos candidatos o índice devolve por rosto para o re-rank exato na galeria.
+FACE_INDEX_RERANK = int(os.getenv("FACE_INDEX_RERANK", "32"))
+# Memória máxima da matriz de distâncias (linhas x centróides) calculada de uma vez
+# no k-means e na atribuição das linhas às listas; o resto é feito em blocos.
+IVF_ASSIGN_BLOCK_MB = int(os.getenv("IVF_ASSIGN_BLOCK_MB", "64"))
+
+
+class FaceIndex(ABC):
+    """
+    Interface dos índices de busca por vizinhos mais próximos.
+    O índice só sugere candidatos (chaves); a decisão final é feita com a
+    distância exata calculada sobre a galeria.
+    """
+
+    @abstractmethod
+    def build(self, keys: np.ndarray, matrix: np.ndarray):
+        ...
+
+    @abstractmethod
+    def add(self, key: int, vector: np.ndarray):
+        ...
+
+    @abstractmethod
+    def remove(self, key: int):
+        ...
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        ...
+
+    @abstractmethod
+    def save(self, path: str):
+        ...
+
+    @abstractmethod
+    def load(self, path: str, keys: np.ndarray, matrix: np.ndarray) -> bool:
+        ...
+
+    def needs_rebuild(self) -> bool:
+        return False
+
+    def empty_copy(self) -> "FaceIndex":
+        """Índice vazio com a mesma configuração, para ser montado em segundo plano."""
+        return type(self)()
+
+
+def nearest_centroids(matrix: np.ndarray, centroids: np.ndarray, centroid_norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Centróide mais próximo de cada linha. A matriz de distâncias é calculada em
+    blocos de linhas para não passar de IVF_ASSIGN_BLOCK_MB (com 1M de linhas e
+    4000 centróides ela teria 16 GB de uma vez).
+    """
+    if centroid_norms is None:
+        centroid_norms = squared_norms(centroids)
+    block_rows = max(1, IVF_ASSIGN_BLOCK_MB * 1024 * 1024 // (4 * len(centroids)))
+    assignment = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), block_rows):
+        block = matrix[start:start + block_rows]
+        assignment[start:start + len(block)] = np.argmin(squared_distance_matrix(block, centroids, centroid_norms), axis=1)
+    return assignment
+
+
+def kmeans(matrix: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """K-means simples em numpy, usado para treinar os centróides do IVF."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroids(matrix, centroids)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        # Cluster vazio: recomeça a partir de um ponto aleatório
+        if empty.any():
+            centroids[empty] = matrix[rng.choice(len(matrix), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex(FaceIndex):
+    """
+    Índice IVF (inverted file): os encodings são agrupados por k-means e a busca
+    só percorre as `nprobe` listas cujos centróides estão mais próximos do rosto.
+
+    Cada lista é uma tupla imutável (chaves, vetores, normas); adicionar ou remover
+    troca só a tupla da lista afetada, então a busca pode rodar sem lock.
+    """
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, min_train_size: int = IVF_MIN_TRAIN_SIZE):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self._lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_norms: Optional[np.ndarray] = None
+        self._lists: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._list_of: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._list_of)
+
+    def _n_clusters(self, size: int) -> int:
+        if size < self.min_train_size:
+            return 1
+        n_clusters = self.nlist or int(4 * np.sqrt(size))
+        return max(1, min(n_clusters, size // 39))
+
+    def _set_centroids(self, centroids: np.ndarray):
+        self._centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._centroid_norms = squared_norms(self._centroids)
+
+    def _assign(self, matrix: np.ndarray) -> np.ndarray:
+        if len(self._centroids) == 1:
+            return np.zeros(len(matrix), dtype=np.int64)
+        return nearest_centroids(matrix, self._centroids, self._centroid_norms)
+
+    def _fill(self, keys: np.ndarray, matrix: np.ndarray, assignment: np.ndarray):
+        lists, list_of = [], {}
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(len(self._centroids) + 1))
+        for c in range(len(self._centroids)):
+            rows = order[bounds[c]:bounds[c + 1]]
+            vectors = np.ascontiguousarray(matrix[rows], dtype=np.float32)
+            lists.append((keys[rows].copy(), vectors, squared_norms(vectors)))
+            for key in keys[rows]:
+                list_of[int(key)] = c
+        self._lists, self._list_of = lists, list_of
+        self._trained_size = len(keys)
+
+    def build(self, keys: np.ndarray, matrix: np.ndarray):
+        keys = np.asarray(keys, dtype=np.int64)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n_clusters = self._n_clusters(len(keys))
+        with self._lock:
+            if n_clusters == 1:
+                self._set_centroids(matrix.mean(axis=0, keepdims=True) if len(matrix) else np.zeros((1, matrix.shape[1])))
+            else:
+                sample = matrix
+                if len(matrix) > 100 * n_clusters:
+                    rng = np.random.default_rng(0)
+                    sample = matrix[rng.choice(len(matrix), 100 * n_clusters, replace=False)]
+                self._set_centroids(kmeans(sample, n_clusters))
+            self._fill(keys, matrix, self._assign(matrix))
+        logger.info(f"Índice IVF construído: {len(keys)} encodings em {len(self._centroids)} listas.")
+
+    def add(self, key: int, vector: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self._remove_locked(key)
+            c = int(self._assign(vector)[0])
+            keys, vectors, norms = self._lists[c]
+            self._lists[c] = (
+                np.append(keys, key),
+                np.vstack([vectors, vector]),
+                np.append(norms, squared_norms(vector)),
+            )
+            self._list_of[int(key)] = c
+
+    def remove(self, key: int):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: int):
+        c = self._list_of.pop(int(key), None)
+        if c is None:
+            return
+        keys, vectors, norms = self._lists[c]
+        keep = keys != key
+        self._lists[c] = (keys[keep], vectors[keep], norms[keep])
+
+    def empty_copy(self) -> "IVFIndex":
+        return IVFIndex(nlist=self.nlist, nprobe=self.nprobe, min_train_size=self.min_train_size)
+
+    def needs_rebuild(self) -> bool:
+        # Os centróides foram treinados para outro tamanho de galeria
+        return self._n_clusters(len(self)) > 2 * len(self._centroids) or (
+            len(self._centroids) > 1 and len(self) < self._trained_size // 4
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self._centroids.shape[1])
+        lists = self._lists
+        nprobe = min(self.nprobe, len(lists))
+        coarse = squared_distance_matrix(queries, self._centroids, self._centroid_norms)
+        probes = np.argsort(coarse, axis=1)[:, :nprobe]
+
+        results = []
+        for query, probe in zip(queries, probes):
+            chosen = [lists[c] for c in probe if len(lists[c][0])]
+            if not chosen:
+                results.append(np.empty(0, dtype=np.int64))
+                continue
+            keys = np.concatenate([item[0] for item in chosen])
+            vectors = np.concatenate([item[1] for item in chosen])
+            norms = np.concatenate([item[2] for item in chosen])
+            distances = squared_distance_matrix(query[np.newaxis, :], vectors, norms)[0]
+            if len(keys) > k:
+                top = np.argpartition(distances, k - 1)[:k]
+                keys = keys[top]
+            results.append(keys)
+        return results
+
+    def save(self, path: str):
+        with self._lock:
+            keys = np.array(list(self._list_of.keys()), dtype=np.int64)
+            assignment = np.array(list(self._list_of.values()), dtype=np.int64)
+            centroids = self._centroids
+            trained_size = self._trained_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=centroids, keys=keys, assignment=assignment, trained_size=trained_size)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str, keys: np.ndarray, matrix: np.ndarray) -> bool:
+        """
+        Recarrega os centróides e a atribuição salvos em disco. Os vetores vêm da
+        galeria; chaves novas são atribuídas ao centróide mais próximo e chaves
+        que não existem mais são descartadas.
+        """
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            saved = dict(zip(data["keys"].tolist(), data["assignment"].tolist()))
+            trained_size = int(data["trained_size"])
+        if centroids.shape[1] != matrix.shape[1]:
+            return False
+
+        keys = np.asarray(keys, dtype=np.int64)
+        with self._lock:
+            self._set_centroids(centroids)
+            assignment = np.array([saved.get(int(key), -1) for key in keys], dtype=np.int64)
+            missing = assignment < 0
+            if missing.any():
+                assignment[missing] = self._assign(np.asarray(matrix[missing], dtype=np.float32))
+            self._fill(keys, matrix, assignment)
+            self._trained_size = trained_size
+        logger.info(f"Índice IVF carregado de {path}: {len(keys)} encodings, {int(missing.sum())} novos.")
+        return True
+
+
+INDEX_TYPES = {
+    "ivf": IVFIndex,
+}
+
+
+def create_index() -> Optional[FaceIndex]:
+    """Cria o índice configurado em FACE_INDEX; None significa busca exaustiva."""
+    if FACE_INDEX in ("", "exact"):
+        return None
+    if FACE_INDEX not in INDEX_TYPES:
+        raise ValueError(f"FACE_INDEX desconhecido: {FACE_INDEX}")
+    return INDEX_TYPES[FACE_INDEX]()
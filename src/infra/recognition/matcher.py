@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import numpy as np
+
+# Quantos candidatos por rosto têm a distância recalculada em float64.
+# O produto de matrizes é feito em float32; o recálculo exato garante que a
+# decisão no limite de `tolerance` é a mesma de face_recognition.face_distance.
+EXACT_RERANK = 4
+
+
+@dataclass
+class FaceMatch:
+    """Resultado da busca de um rosto: melhor linha da galeria (-1 se nenhuma) e top-k."""
+    row: int
+    distance: float
+    candidates: List[Tuple[int, float]] = field(default_factory=list)
+
+    @property
+    def matched(self) -> bool:
+        return self.row >= 0
+
+
+def squared_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def squared_distance_matrix(queries: np.ndarray, matrix: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+    """
+    Distâncias euclidianas ao quadrado (F x N) entre os rostos e a galeria,
+    usando |q|² + |g|² - 2 q·g: um único produto de matrizes (BLAS).
+    """
+    queries = np.ascontiguousarray(queries, dtype=matrix.dtype)
+    distances = queries @ matrix.T
+    distances *= -2.0
+    distances += sq_norms[np.newaxis, :]
+    distances += squared_norms(queries)[:, np.newaxis]
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+def exact_distances(query: np.ndarray, matrix: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Mesma conta de face_recognition.face_distance, só para as linhas indicadas."""
+    return np.linalg.norm(matrix[rows].astype(np.float64) - np.asarray(query, dtype=np.float64), axis=1)
+
+
+def match_faces(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    sq_norms: np.ndarray,
+    tolerance: float,
+    top_k: int = 0,
+) -> List[FaceMatch]:
+    """
+    Compara todos os rostos detectados com a galeria de uma só vez.
+    Um rosto é reconhecido quando a menor distância é <= tolerance,
+    exatamente como compare_faces + face_distance faziam.
+    """
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, matrix.shape[1])
+    if len(queries) == 0:
+        return []
+    if len(matrix) == 0:
+        return [FaceMatch(row=-1, distance=float("inf")) for _ in range(len(queries))]
+
+    distances = squared_distance_matrix(queries, matrix, sq_norms)
+    k = min(max(top_k, EXACT_RERANK), matrix.shape[0])
+    if k < matrix.shape[0]:
+        shortlist = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        shortlist = np.broadcast_to(np.arange(matrix.shape[0]), (len(queries), k))
+
+    return [_rank_exact(query, matrix, rows, tolerance, top_k) for query, rows in zip(queries, shortlist)]
+
+
+def match_candidates(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    candidate_rows: List[np.ndarray],
+    tolerance: float,
+    top_k: int = 0,
+) -> List[FaceMatch]:
+    """
+    Igual a match_faces, mas cada rosto só é comparado com as linhas candidatas
+    sugeridas por um índice aproximado (ver index.py). As distâncias são exatas.
+    """
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, matrix.shape[1])
+    results = []
+    for query, rows in zip(queries, candidate_rows):
+        if len(rows) == 0:
+            results.append(FaceMatch(row=-1, distance=float("inf")))
+            continue
+        results.append(_rank_exact(query, matrix, np.asarray(rows), tolerance, top_k))
+    return results
+
+
+def _rank_exact(query: np.ndarray, matrix: np.ndarray, rows: np.ndarray, tolerance: float, top_k: int) -> FaceMatch:
+    # Em caso de empate vence a menor linha, como no np.argmin original
+    rows = np.sort(rows)
+    exact = exact_distances(query, matrix, rows)
+    order = np.argsort(exact, kind="stable")
+    rows, exact = rows[order], exact[order]
+    best_row, best_distance = int(rows[0]), float(exact[0])
+    return FaceMatch(
+        row=best_row if best_distance <= tolerance else -1,
+        distance=best_distance,
+        candidates=[(int(r), float(d)) for r, d in zip(rows[:top_k], exact[:top_k])],
+    )
@@ -0,0 +1,107 @@
+import logging
+from typing import List, Optional, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+from src.infra.metrics import stage
+from src.infra.profiling import annotate
+from src.infra.recognition.codec import ENCODING_SIZE
+from src.infra.recognition.detection import (
+    ENROLLMENT_DETECTION_PROFILE,
+    Box,
+    DetectionProfile,
+    decode_bgr,
+    get_profile,
+    locate_faces,
+)
+from src.infra.recognition.tracker import needs_encoding
+
+# Etapas de CPU do reconhecimento (decodificar, detectar, extrair encodings).
+# Este módulo não depende do banco para poder rodar nos processos do pool.
+logger = logging.getLogger(__name__)
+
+
+def decode_image(image_file_content: bytes, reduction: int = 1) -> np.ndarray:
+    # Converte os bytes da imagem para um array numpy (BGR)
+    with stage("decode"):
+        image_bgr = decode_bgr(image_file_content, reduction)
+
+    if image_bgr is None:
+        logger.error("Falha ao decodificar a imagem enviada. Imagem pode estar corrompida ou formato inválido.")
+        raise ValueError("Não foi possível decodificar a imagem enviada. Verifique o formato.")
+
+    annotate(image_width=image_bgr.shape[1], image_height=image_bgr.shape[0], decode_reduction=reduction)
+    return image_bgr
+
+
+def _locate_and_encode(image_file_content: bytes, profile: DetectionProfile):
+    image_bgr = decode_image(image_file_content, profile.decode_reduction)
+    with stage("detect"):
+        face_locations, image_rgb = locate_faces(image_bgr, profile)
+    annotate(detection_profile=profile.name, faces=len(face_locations))
+    if not face_locations:
+        return face_locations, []
+    with stage("encode"):
+        if image_rgb is None:
+            # A detecção rodou numa cópia reduzida; os encodings usam a resolução completa
+            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        return face_locations, face_recognition.face_encodings(image_rgb, face_locations, profile.num_jitters)
+
+
+def detect_and_encode(image_file_content: bytes, profile_name: Optional[str] = None) -> np.ndarray:
+    """Detecta todos os rostos da imagem e devolve os encodings (F x 128)."""
+    _, face_encodings = _locate_and_encode(image_file_content, get_profile(profile_name))
+    if not face_encodings:
+        return np.empty((0, ENCODING_SIZE))
+    return np.vstack(face_encodings)
+
+
+def detect_and_encode_tracked(
+    image_file_content: bytes,
+    skip_boxes: List[Box],
+    profile_name: Optional[str] = None,
+) -> Tuple[List[Box], List[Optional[np.ndarray]]]:
+    """
+    Como detect_and_encode, mas não calcula o encoding dos rostos que coincidem
+    com `skip_boxes` (rastros cuja identidade já é conhecida). Devolve as caixas
+    e, para cada uma, o encoding ou None.
+    """
+    profile = get_profile(profile_name)
+    image_bgr = decode_image(image_file_content, profile.decode_reduction)
+    with stage("detect"):
+        face_locations, image_rgb = locate_faces(image_bgr, profile)
+    encode_mask = needs_encoding(face_locations, skip_boxes)
+    annotate(detection_profile=profile.name, faces=len(face_locations), faces_encoded=sum(encode_mask))
+    to_encode = [box for box, needed in zip(face_locations, encode_mask) if needed]
+    if not to_encode:
+        return face_locations, [None] * len(face_locations)
+
+    with stage("encode"):
+        if image_rgb is None:
+            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        encoded = iter(face_recognition.face_encodings(image_rgb, to_encode, profile.num_jitters))
+    return face_locations, [next(encoded) if needed else None for needed in encode_mask]
+
+
+def extract_face_encoding(image_file_content: bytes, profile_name: Optional[str] = None) -> np.ndarray:
+    """Extrai o encoding de uma imagem de cadastro, que deve ter exatamente um rosto."""
+    profile = get_profile(profile_name or ENROLLMENT_DETECTION_PROFILE)
+
+    # Detecta e extrai encodings
+    _, encodings = _locate_and_encode(image_file_content, profile)
+
+    if not encodings:
+        raise ValueError("Nenhum rosto detectado na imagem fornecida.")
+    if len(encodings) > 1:
+        raise ValueError("Mais de um rosto detectado na imagem. Por favor, forneça uma imagem com apenas um rosto.")
+
+    return encodings[0]
+
+
+def warm_up():
+    """Força o carregamento dos modelos do dlib antes da primeira requisição."""
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    face_recognition.face_encodings(blank, [(8, 56, 56, 8)])
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da fotografia da galeria em disco ---
+# Os workers do uvicorn mapeiam a mesma fotografia (somente leitura) em vez de
+# cada um ler a tabela `users` e manter uma cópia própria dos encodings.
+GALLERY_SNAPSHOT_ENABLED = os.getenv("GALLERY_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+GALLERY_SNAPSHOT_DIR = os.getenv("GALLERY_SNAPSHOT_DIR", os.path.join("data", "gallery"))
+# Espera após uma alteração antes de regravar a fotografia (agrupa alterações em sequência)
+GALLERY_SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv("GALLERY_SNAPSHOT_DEBOUNCE_SECONDS", "5"))
+# Intervalo mínimo entre verificações do ponteiro para a fotografia atual
+GALLERY_SNAPSHOT_CHECK_SECONDS = float(os.getenv("GALLERY_SNAPSHOT_CHECK_SECONDS", "1"))
+GALLERY_SNAPSHOT_KEEP = int(os.getenv("GALLERY_SNAPSHOT_KEEP", "2"))
+
+_POINTER = "CURRENT"
+_LOCK = ".lock"
+_META = "meta.json"
+
+
+class SnapshotStore:
+    """
+    Fotografias versionadas da galeria em disco: cada geração é uma pasta com os
+    arrays em `.npy` e os metadados em JSON, e o arquivo CURRENT aponta para a
+    geração atual. A pasta nova é criada com outro nome e renomeada (atômico), e
+    só depois o ponteiro é trocado, então quem lê nunca vê uma geração incompleta.
+    """
+
+    def __init__(self, directory: str = GALLERY_SNAPSHOT_DIR, keep: int = GALLERY_SNAPSHOT_KEEP):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self._thread_lock = threading.Lock()
+        self._next_check = 0.0
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"g{generation:012d}")
+
+    @contextmanager
+    def lock(self):
+        """Lock exclusivo entre processos, para que só um worker grave por vez."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, _LOCK), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def current_generation(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.directory, _POINTER), "r") as f:
+                return int(f.read().strip().lstrip("g"))
+        except (OSError, ValueError):
+            return None
+
+    def due(self) -> bool:
+        """True no máximo uma vez a cada GALLERY_SNAPSHOT_CHECK_SECONDS (verificação barata no caminho da requisição)."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + GALLERY_SNAPSHOT_CHECK_SECONDS
+        return True
+
+    def load(self) -> Optional[Tuple[int, Dict[str, np.ndarray], dict]]:
+        """Mapeia a geração atual em modo somente leitura. Devolve (geração, arrays, metadados)."""
+        generation = self.current_generation()
+        if generation is None:
+            return None
+        path = self._generation_dir(generation)
+        try:
+            with open(os.path.join(path, _META), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in meta["arrays"]
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Não foi possível abrir a fotografia da galeria em {path}: {e}")
+            return None
+        return generation, arrays, meta
+
+    def write(self, arrays: Dict[str, np.ndarray], meta: dict) -> int:
+        """Grava uma nova geração e aponta CURRENT para ela. Deve ser chamado dentro de `lock()`."""
+        os.makedirs(self.directory, exist_ok=True)
+        generation = (self.current_generation() or 0) + 1
+        tmp_dir = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_dir, _META), "w", encoding="utf-8") as f:
+                json.dump(dict(meta, arrays=list(arrays), generation=generation), f, ensure_ascii=False)
+            os.rename(tmp_dir, self._generation_dir(generation))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        fd, tmp_pointer = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(f"g{generation:012d}\n")
+        os.replace(tmp_pointer, os.path.join(self.directory, _POINTER))
+        self._cleanup(generation)
+        logger.info(f"Fotografia da galeria gravada: geração {generation}.")
+        return generation
+
+    def _cleanup(self, generation: int):
+        # Workers que ainda mapeiam uma geração removida continuam lendo-a normalmente
+        old = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("g") and name != f"g{generation:012d}"
+        )
+        for name in old[:max(0, len(old) - (self.keep - 1))]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def create_snapshot_store() -> Optional[SnapshotStore]:
+    return SnapshotStore() if GALLERY_SNAPSHOT_ENABLED else None
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+from src.infra.recognition.codec import ENCODING_SIZE
+
+# --- Configuração do template por usuário ---
+# Linhas de cada usuário na galeria: o centróide das amostras + as mais diversas
+TEMPLATE_MAX_SAMPLES = max(1, min(int(os.getenv("TEMPLATE_MAX_SAMPLES", "5")), 255))
+# Amostras guardadas por usuário no banco (user_encodings + a foto de cadastro)
+USER_MAX_SAMPLES = int(os.getenv("USER_MAX_SAMPLES", "20"))
+
+# As linhas da galeria (e do índice) são identificadas por (id do usuário, posição no template)
+_SLOT_BITS = 8
+
+
+def row_key(user_id: int, slot: int) -> int:
+    return (int(user_id) << _SLOT_BITS) | slot
+
+
+def key_user(key: int) -> int:
+    return int(key) >> _SLOT_BITS
+
+
+def build_template(samples: np.ndarray, max_rows: int = TEMPLATE_MAX_SAMPLES) -> np.ndarray:
+    """
+    Resume as amostras de um usuário em no máximo `max_rows` linhas: o centróide
+    e, por amostragem do ponto mais distante, as amostras que mais diferem dele e
+    entre si (iluminação, ângulo). Com uma amostra só, o template é ela mesma.
+    """
+    samples = np.asarray(samples, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    if len(samples) <= 1:
+        return samples
+    centroid = samples.mean(axis=0, keepdims=True)
+    picks = []
+    nearest = np.linalg.norm(samples - centroid, axis=1)
+    for _ in range(min(max_rows - 1, len(samples))):
+        i = int(np.argmax(nearest))
+        picks.append(i)
+        nearest = np.minimum(nearest, np.linalg.norm(samples - samples[i], axis=1))
+        nearest[picks] = -1.0
+    return np.vstack([centroid] + [samples[picks]]) if picks else centroid
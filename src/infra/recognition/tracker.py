@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.infra.recognition.detection import Box, box_iou
+
+# --- Configuração do rastreamento por câmera ---
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.4"))
+# A cada quantos quadros um rosto rastreado é codificado de novo
+TRACK_REENCODE_INTERVAL = int(os.getenv("TRACK_REENCODE_INTERVAL", "10"))
+# Tempo sem ver um rosto até o rastro ser descartado
+TRACK_MAX_AGE_SECONDS = float(os.getenv("TRACK_MAX_AGE_SECONDS", "2.0"))
+TRACKER_MAX_CAMERAS = int(os.getenv("TRACKER_MAX_CAMERAS", "256"))
+TRACKER_IDLE_SECONDS = float(os.getenv("TRACKER_IDLE_SECONDS", "60"))
+
+
+@dataclass
+class Track:
+    box: Box
+    last_seen: float
+    # Identidade resolvida na última vez que o rosto foi codificado (None = desconhecido)
+    user_id: Optional[int] = None
+    resolved: bool = False
+    frames_since_encode: int = 0
+    candidates: list = field(default_factory=list)
+
+    def resolve(self, user_id: Optional[int], candidates: Optional[list] = None):
+        self.user_id = user_id
+        self.resolved = True
+        self.frames_since_encode = 0
+        self.candidates = candidates or []
+
+    def invalidate(self):
+        self.resolved = False
+        self.user_id = None
+
+
+def needs_encoding(boxes: List[Box], skip_boxes: List[Box], iou_threshold: float = TRACK_IOU_THRESHOLD) -> List[bool]:
+    """Indica quais caixas detectadas não correspondem a nenhum rastro que pode ser reaproveitado."""
+    return [
+        not any(box_iou(box, skip) >= iou_threshold for skip in skip_boxes)
+        for box in boxes
+    ]
+
+
+class CameraTracker:
+    """
+    Estado de rastreamento de uma câmera: liga as caixas de quadros consecutivos
+    por IoU e guarda a identidade já resolvida de cada rosto, para que o encoding
+    (a etapa mais cara) só rode em rostos novos ou a cada TRACK_REENCODE_INTERVAL quadros.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD, reencode_interval: int = TRACK_REENCODE_INTERVAL):
+        self.iou_threshold = iou_threshold
+        self.reencode_interval = reencode_interval
+        self.tracks: List[Track] = []
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _expire(self, now: float):
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= TRACK_MAX_AGE_SECONDS]
+
+    def reusable_boxes(self) -> List[Box]:
+        """Caixas dos rastros cuja identidade ainda pode ser reaproveitada sem novo encoding."""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            return [t.box for t in self.tracks if t.resolved and t.frames_since_encode < self.reencode_interval]
+
+    def update(self, boxes: List[Box], encoded: List[bool]) -> List[Track]:
+        """
+        Associa as caixas do quadro atual aos rastros existentes (guloso, por IoU).
+        Caixas sem encoding precisam casar com um rastro resolvido; as demais
+        podem abrir um rastro novo. Devolve o rastro de cada caixa, na mesma ordem.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.last_used = now
+            self._expire(now)
+
+            pairs = sorted(
+                (
+                    (box_iou(box, track.box), i, j)
+                    for i, box in enumerate(boxes)
+                    for j, track in enumerate(self.tracks)
+                ),
+                reverse=True,
+            )
+            assigned: List[Optional[Track]] = [None] * len(boxes)
+            used = set()
+            for iou, i, j in pairs:
+                if iou < self.iou_threshold:
+                    break
+                if assigned[i] is not None or j in used:
+                    continue
+                assigned[i] = self.tracks[j]
+                used.add(j)
+
+            for i, box in enumerate(boxes):
+                track = assigned[i]
+                if track is None:
+                    track = Track(box=box, last_seen=now)
+                    self.tracks.append(track)
+                    assigned[i] = track
+                elif encoded[i] is False and not track.resolved:
+                    # Sem encoding e sem identidade para reaproveitar
+                    track.invalidate()
+                track.box = box
+                track.last_seen = now
+                track.frames_since_encode += 1
+            return assigned
+
+
+class TrackerRegistry:
+    """Rastreadores por câmera, com limite de câmeras e descarte das inativas."""
+
+    def __init__(self, max_cameras: int = TRACKER_MAX_CAMERAS, idle_seconds: float = TRACKER_IDLE_SECONDS):
+        self.max_cameras = max_cameras
+        self.idle_seconds = idle_seconds
+        self._trackers: "OrderedDict[str, CameraTracker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, camera_id: str) -> CameraTracker:
+        with self._lock:
+            now = time.monotonic()
+            tracker = self._trackers.pop(camera_id, None)
+            if tracker is None or now - tracker.last_used > self.idle_seconds:
+                tracker = CameraTracker()
+            self._trackers[camera_id] = tracker
+            while len(self._trackers) > self.max_cameras:
+                self._trackers.popitem(last=False)
+            return tracker
+
+
+# Instância única do processo.
+trackers = TrackerRegistry()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from src.infra.metrics import collect_stages, observe_stages, record_stage
+from src.infra.profiling import RequestProfile, capture
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do pool de processos ---
+# RECOGNITION_POOL_SIZE=0 desliga o pool e roda as etapas numa thread do servidor.
+RECOGNITION_POOL_SIZE = int(os.getenv("RECOGNITION_POOL_SIZE", str(os.cpu_count() or 1)))
+# Máximo de imagens aguardando ou em processamento; acima disso a requisição é recusada.
+RECOGNITION_QUEUE_DEPTH = int(os.getenv("RECOGNITION_QUEUE_DEPTH", str(4 * max(RECOGNITION_POOL_SIZE, 1))))
+RECOGNITION_POOL_START_METHOD = os.getenv("RECOGNITION_POOL_START_METHOD", "spawn")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _init_worker():
+    # Carrega os modelos do dlib uma vez por processo, na subida do pool
+    from src.infra.recognition.pipeline import warm_up
+    warm_up()
+
+
+def _run_with_stages(profile: bool, fn, *args):
+    # Roda no processo do pool: os tempos das etapas (e o perfil, se pedido) voltam
+    # junto com o resultado, já que as métricas do processo do pool não são exportadas
+    start = time.perf_counter()
+    with collect_stages() as stages, (capture() if profile else nullcontext()) as captured:
+        try:
+            result = fn(*args)
+        except Exception as e:
+            # O perfil de uma execução com erro também interessa; vai junto com a exceção
+            if captured is not None:
+                e.profile_capture = captured
+            raise
+    return result, stages, time.perf_counter() - start, captured
+
+
+class RecognitionPool:
+    """
+    Executa as etapas de CPU (decodificar, detectar e extrair encodings) em um
+    pool de processos, sem bloquear o event loop do servidor.
+    """
+
+    def __init__(self, size: int = RECOGNITION_POOL_SIZE, queue_depth: int = RECOGNITION_QUEUE_DEPTH):
+        self.size = size
+        self.queue_depth = queue_depth
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def has_capacity(self, n: int = 1) -> bool:
+        return self._pending + n <= self.queue_depth
+
+    def start(self):
+        if self.size <= 0 or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context(RECOGNITION_POOL_START_METHOD),
+            initializer=_init_worker,
+        )
+        # Sobe todos os processos agora, em vez de na primeira requisição
+        for future in [self._executor.submit(os.getpid) for _ in range(self.size)]:
+            future.result()
+        logger.info(f"Pool de reconhecimento iniciado com {self.size} processos.")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Envia `fn(*args)` ao pool a partir de código síncrono (tarefas em lote, como a
+        importação de usuários). Não conta na fila das requisições; quem chama limita
+        quantas tarefas deixa em andamento. Sem pool, executa na hora.
+        """
+        if self._executor is not None:
+            return self._executor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    async def run(self, fn, *args, profile: Optional[RequestProfile] = None):
+        """Executa `fn(*args)` no pool e aguarda o resultado sem bloquear o loop. Com `profile`, perfila a execução."""
+        if self._pending >= self.queue_depth:
+            raise QueueFullError("Fila de reconhecimento cheia. Tente novamente em instantes.")
+        self._pending += 1
+        start = time.perf_counter()
+        try:
+            if self._executor is None:
+                result, stages, elapsed, captured = await run_in_threadpool(_run_with_stages, profile is not None, fn, *args)
+            else:
+                result, stages, elapsed, captured = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _run_with_stages, profile is not None, fn, *args
+                )
+            observe_stages(stages)
+            if profile is not None:
+                profile.add_capture(captured)
+            # Tempo na fila do pool e transferência dos dados entre processos
+            record_stage("pool_wait", max(0.0, time.perf_counter() - start - elapsed))
+            return result
+        except Exception as e:
+            if profile is not None:
+                profile.add_capture(getattr(e, "profile_capture", None))
+            raise
+        finally:
+            self._pending -= 1
+
+
+# Instância única do processo.
+recognition_pool = RecognitionPool()
@@ -1,22 +1,109 @@
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from .database import get_db
+from starlette.concurrency import run_in_threadpool
+from .database import SessionLocal
 from .models.admin import Admin
-from .schemas.admin import TokenData
 
 # --- Configurações de Segurança ---
 SECRET_KEY = "sua_chave_secreta_aqui" # Mude para uma chave forte e armazene de forma segura!
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# --- Cache de tokens validados ---
+# Requisições seguidas com o mesmo token (ex.: painel consultando a API) não
+# decodificam o JWT nem consultam a tabela de administradores de novo.
+ADMIN_TOKEN_CACHE_TTL = float(os.getenv("ADMIN_TOKEN_CACHE_TTL", "60"))
+ADMIN_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("ADMIN_TOKEN_CACHE_MAX_ENTRIES", "1024"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="admin/token")
 
+
+class AdminTokenCache:
+    """
+    Cache TTL limitado de token → administrador já validado. Cada entrada vale até
+    ADMIN_TOKEN_CACHE_TTL segundos ou até o token expirar, o que vier antes, e é
+    descartada quando o administrador é alterado ou removido neste processo.
+    """
+
+    def __init__(self, ttl_seconds: float = ADMIN_TOKEN_CACHE_TTL, max_entries: int = ADMIN_TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, token: str) -> Optional[Admin]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, admin: Admin, token_expires_at: Optional[float] = None):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        # Guarda só id e nome, numa instância fora de qualquer sessão (sem o hash da senha)
+        principal = Admin(id=admin.id, name=admin.name)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, admin_id: Optional[int] = None, name: Optional[str] = None):
+        with self._lock:
+            for token in [
+                token for token, (principal, _) in self._entries.items()
+                if (admin_id is not None and principal.id == admin_id) or (name is not None and principal.name == name)
+            ]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Instância única do processo.
+admin_tokens = AdminTokenCache()
+
+
+# Qualquer alteração de administrador pelo ORM descarta os tokens em cache dele
+@event.listens_for(Admin, "after_insert")
+@event.listens_for(Admin, "after_update")
+@event.listens_for(Admin, "after_delete")
+def _invalidate_admin_tokens(mapper, connection, target):
+    admin_tokens.invalidate(admin_id=target.id, name=target.name)
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -33,21 +120,47 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _validate_token(token: str, db: Session) -> Optional[Admin]:
+    # Decodifica o JWT e consulta o administrador; guarda o resultado no cache
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    name: str = payload.get("sub")
+    if name is None:
+        return None
+    admin = db.query(Admin).filter(Admin.name == name).first()
+    if admin is not None:
+        admin_tokens.put(token, admin, payload.get("exp"))
+    return admin
+
+def get_admin_from_token(token: str, db: Session) -> Optional[Admin]:
+    """Administrador dono do token JWT, ou None se o token for inválido ou o administrador não existir."""
+    return admin_tokens.get(token) or _validate_token(token, db)
+
+def _validate_token_in_own_session(token: str) -> Optional[Admin]:
+    # Sessão curta, só para a consulta: a conexão volta ao pool antes da rota rodar
+    db = SessionLocal()
+    try:
+        return _validate_token(token, db)
+    finally:
+        db.close()
+
+async def get_current_admin(token: str = Depends(oauth2_scheme)):
+    """
+    Administrador autenticado. Não depende de get_db: as rotas de leitura usam
+    get_read_db, e uma Session síncrona extra prenderia uma segunda conexão do
+    pool durante toda a requisição. Com o token em cache, nem abre sessão.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        name: str = payload.get("sub")
-        if name is None:
-            raise credentials_exception
-        token_data = TokenData(name=name)
-    except JWTError:
-        raise credentials_exception
-    admin = db.query(Admin).filter(Admin.name == token_data.name).first()
+    # Token em cache responde direto; senão a validação e a consulta ao banco rodam fora do event loop
+    admin = admin_tokens.get(token)
+    if admin is None:
+        admin = await run_in_threadpool(_validate_token_in_own_session, token)
     if admin is None:
         raise credentials_exception
     return admin
\ No newline at end of file
@@ -2,8 +2,11 @@
 
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from src.infra.metrics import METRICS_DB_ENABLED, instrument_engine
 
 # Lê a string de conexão a partir da variável de ambiente do EasyPanel.
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -12,11 +15,67 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("A variável de ambiente DATABASE_URL não foi definida!")
 
+# --- Configuração do pool de conexões (ignorada no SQLite) ---
+# Conexões mantidas abertas por processo e quantas podem ser abertas além delas nos picos
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Segundos esperando uma conexão livre antes de falhar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Testa a conexão antes de usar (o MySQL derruba conexões ociosas após wait_timeout)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Segundos até uma conexão ser descartada e reaberta; deve ficar abaixo do wait_timeout do MySQL
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# --- Sessões assíncronas (opcional) ---
+# Com DATABASE_ASYNC, as rotas de leitura usam AsyncSession com um driver assíncrono
+# (aiomysql no MySQL, aiosqlite no SQLite). DATABASE_ASYNC_URL é derivada de DATABASE_URL se não for definida.
+# O aiomysql está em requirements.txt; o aiosqlite, usado em testes e desenvolvimento, em requirements-dev.txt.
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "false").lower() in ("1", "true", "yes")
+_ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+
+def engine_options(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # O SQLite usa o pool padrão do SQLAlchemy, sem esses parâmetros
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def async_database_url(url: str) -> str:
+    """Troca o driver síncrono (pymysql, pysqlite) pelo assíncrono equivalente."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.get_driver_name() in ("aiomysql", "asyncmy", "aiosqlite"):
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
 # Cria o motor da base de dados usando a URL correta.
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+# Tempos dos comandos SQL e de uso das conexões, exportados em /metrics
+if METRICS_DB_ENABLED:
+    instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    DATABASE_ASYNC_URL = os.getenv("DATABASE_ASYNC_URL") or async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(DATABASE_ASYNC_URL, **engine_options(DATABASE_ASYNC_URL))
+    if METRICS_DB_ENABLED:
+        instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +84,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_read_db():
+    """
+    Sessão das rotas de leitura: AsyncSession com DATABASE_ASYNC; senão a Session
+    síncrona, que os repositórios de leitura executam no threadpool.
+    """
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+# --- Configuração da janela de de-duplicação de logs ---
+# Dentro da janela o reconhecimento continua sendo devolvido, mas não gera outro UserLog.
+LOG_DEDUP_WINDOW_SECONDS = float(os.getenv("LOG_DEDUP_WINDOW_SECONDS", "30"))
+# Janela separada por câmera (X-Camera-Id) ou uma só por usuário
+LOG_DEDUP_PER_CAMERA = os.getenv("LOG_DEDUP_PER_CAMERA", "true").lower() in ("1", "true", "yes")
+LOG_DEDUP_MAX_ENTRIES = int(os.getenv("LOG_DEDUP_MAX_ENTRIES", "100000"))
+
+# (user_id, log_time do registro gravado, camera_id, reconhecimentos extras)
+HitUpdate = Tuple[int, datetime, Optional[str], int]
+
+
+class _Window:
+    __slots__ = ("log_time", "camera_id", "expires_at", "extra_hits")
+
+    def __init__(self, log_time: datetime, camera_id: Optional[str], expires_at: float):
+        self.log_time = log_time
+        self.camera_id = camera_id
+        self.expires_at = expires_at
+        self.extra_hits = 0
+
+
+class LogDeduplicator:
+    """
+    Cache TTL limitado com a última entrada registrada de cada usuário (e câmera).
+
+    Reconhecimentos repetidos dentro da janela não são gravados; eles são contados e,
+    quando a janela fecha (ou a entrada sai do cache), o total é somado na coluna
+    `hits` do UserLog que abriu a janela, através de `on_hits`. As janelas vencidas
+    são fechadas pelo próximo reconhecimento ou por `sweep`, chamado periodicamente
+    pela thread do gravador de logs.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = LOG_DEDUP_WINDOW_SECONDS,
+        per_camera: bool = LOG_DEDUP_PER_CAMERA,
+        max_entries: int = LOG_DEDUP_MAX_ENTRIES,
+        on_hits: Optional[Callable[[List[HitUpdate]], None]] = None,
+    ):
+        self.window_seconds = window_seconds
+        self.per_camera = per_camera
+        self.max_entries = max_entries
+        self.on_hits = on_hits
+        self._windows: "OrderedDict[tuple, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def should_log(self, user_id: int, log_time: datetime, camera_id: Optional[str] = None) -> bool:
+        """True se este reconhecimento deve gerar um UserLog; False se cai numa janela aberta."""
+        if not self.enabled:
+            return True
+        key = (user_id, camera_id if self.per_camera else None)
+        now = time.monotonic()
+        closed: List[HitUpdate] = []
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window.expires_at > now:
+                window.extra_hits += 1
+                self.suppressed_total += 1
+                return False
+
+            if window is not None:
+                closed.extend(self._close(key, window))
+            self._windows[key] = _Window(log_time, camera_id, now + self.window_seconds)
+            closed.extend(self._evict(now))
+        self._emit(closed)
+        return True
+
+    def sweep(self):
+        """Fecha as janelas já vencidas, mesmo sem novos reconhecimentos."""
+        with self._lock:
+            closed = self._evict(time.monotonic())
+        self._emit(closed)
+
+    def forget_user(self, user_id: int):
+        """Descarta as janelas do usuário removido: os logs delas foram apagados junto."""
+        with self._lock:
+            for key in [key for key in self._windows if key[0] == user_id]:
+                del self._windows[key]
+
+    def flush(self):
+        """Fecha todas as janelas, repassando os reconhecimentos contados (usado na parada)."""
+        with self._lock:
+            closed = [update for key, window in list(self._windows.items()) for update in self._close(key, window)]
+        self._emit(closed)
+
+    def _close(self, key: tuple, window: _Window) -> List[HitUpdate]:
+        del self._windows[key]
+        if window.extra_hits:
+            return [(key[0], window.log_time, window.camera_id, window.extra_hits)]
+        return []
+
+    def _evict(self, now: float) -> List[HitUpdate]:
+        closed = []
+        # As entradas mais antigas ficam no começo do OrderedDict
+        while self._windows:
+            key, window = next(iter(self._windows.items()))
+            if window.expires_at > now and len(self._windows) <= self.max_entries:
+                break
+            closed.extend(self._close(key, window))
+        return closed
+
+    def _emit(self, updates: List[HitUpdate]):
+        if updates and self.on_hits is not None:
+            self.on_hits(updates)
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from .database import SessionLocal
+from .repositories.user_log import UserLogRepository
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da exportação de logs ---
+# Linhas buscadas do banco (e codificadas) por vez
+LOG_EXPORT_CHUNK_SIZE = int(os.getenv("LOG_EXPORT_CHUNK_SIZE", "1000"))
+LOG_EXPORT_GZIP_LEVEL = int(os.getenv("LOG_EXPORT_GZIP_LEVEL", "6"))
+
+EXPORT_COLUMNS = ("id", "user_id", "user_name", "log_time", "camera_id", "hits")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _row_values(row) -> tuple:
+    return (
+        row.id,
+        row.user_id,
+        row.user_name,
+        row.log_time.isoformat() if row.log_time else None,
+        row.camera_id,
+        row.hits,
+    )
+
+
+def _encode_csv(rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(_row_values(row) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(rows, header: bool) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row))), ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode("utf-8")
+
+
+_ENCODERS = {"csv": _encode_csv, "ndjson": _encode_ndjson}
+
+
+def export_user_logs(
+    export_format: str,
+    compress: bool = False,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = LOG_EXPORT_CHUNK_SIZE,
+    session_factory=SessionLocal,
+) -> Iterator[bytes]:
+    """
+    Gera a exportação dos logs em pedaços de bytes, prontos para um StreamingResponse.
+
+    Abre a própria sessão (a da requisição pode ser fechada antes do fim do stream)
+    e codifica `chunk_size` linhas por vez, então a memória não cresce com o histórico.
+    O cabeçalho do CSV sai antes da primeira consulta terminar.
+    """
+    encode = _ENCODERS[export_format]
+    compressor = zlib.compressobj(LOG_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if export_format == "csv":
+        yield emit(encode([], header=True))
+
+    db = session_factory()
+    try:
+        chunk = []
+        for row in UserLogRepository(db).iter_user_logs(chunk_size, user_id, start, end):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                data = emit(encode(chunk, header=False))
+                chunk = []
+                if data:
+                    yield data
+        if chunk:
+            yield emit(encode(chunk, header=False))
+    except Exception as e:
+        # O status 200 já foi enviado; o erro só pode ser registrado e o stream interrompido
+        logger.error(f"Erro durante a exportação de logs: {e}")
+        raise
+    finally:
+        db.close()
+
+    if compressor:
+        yield compressor.flush()
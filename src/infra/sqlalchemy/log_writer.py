@@ -0,0 +1,262 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from .database import SessionLocal
+from .models.user_log import UserLog
+from .repositories.user_log import add_hits_statement, add_hits_params
+from .log_dedup import LogDeduplicator
+from src.infra.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do gravador de logs em segundo plano ---
+LOG_WRITER_ENABLED = os.getenv("LOG_WRITER_ENABLED", "true").lower() in ("1", "true", "yes")
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", "200"))
+LOG_WRITER_FLUSH_INTERVAL = float(os.getenv("LOG_WRITER_FLUSH_INTERVAL", "1.0"))
+LOG_WRITER_MAX_QUEUE = int(os.getenv("LOG_WRITER_MAX_QUEUE", "10000"))
+
+_STOP = object()
+
+
+class UserLogWriter:
+    """
+    Grava os eventos de reconhecimento (UserLog) fora do caminho da requisição.
+
+    Os eventos ficam numa fila em memória e uma thread os grava com INSERTs em lote
+    quando o lote atinge LOG_WRITER_BATCH_SIZE ou a cada LOG_WRITER_FLUSH_INTERVAL
+    segundos. Na parada do servidor a fila é esvaziada antes de encerrar.
+
+    A cada LOG_WRITER_FLUSH_INTERVAL a thread também chama `on_tick` (a varredura
+    das janelas vencidas da de-duplicação), mesmo com a fila vazia.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        batch_size: int = LOG_WRITER_BATCH_SIZE,
+        flush_interval: float = LOG_WRITER_FLUSH_INTERVAL,
+        max_queue: int = LOG_WRITER_MAX_QUEUE,
+        on_tick: Optional[Callable[[], None]] = None,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_tick = on_tick
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._hit_updates = 0
+        self._hit_failures = 0
+        self._flushes = 0
+        self._flush_seconds_total = 0.0
+        self._last_flush_seconds = 0.0
+        self._max_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="user-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Esvazia a fila e encerra a thread."""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, entries: Iterable[Tuple[int, datetime, Optional[str]]]) -> bool:
+        """Enfileira (user_id, log_time, camera_id). Devolve False se o gravador não estiver ativo."""
+        if not self.running:
+            return False
+        for user_id, log_time, camera_id in entries:
+            if isinstance(log_time, str):
+                log_time = datetime.fromisoformat(log_time)
+            self._put(("insert", {"user_id": user_id, "log_time": log_time, "camera_id": camera_id}))
+        return True
+
+    def submit_hits(self, updates) -> bool:
+        """Enfileira os reconhecimentos extras contados pela janela de de-duplicação."""
+        if not self.running:
+            return False
+        for update in updates:
+            self._put(("hits", update))
+        return True
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+            logger.error(f"Fila de logs cheia; evento '{item[0]}' descartado: {item[1]}")
+
+    def write_hits(self, updates):
+        """Destino dos reconhecimentos suprimidos: pela fila ou, sem gravador ativo, direto no banco."""
+        if self.submit_hits(updates):
+            return
+        applied, failed = self._write_hits(updates)
+        with self._stats_lock:
+            self._hit_updates += applied
+            self._hit_failures += failed
+
+    def _run(self):
+        batch = []
+        deadline = None
+        next_tick = time.monotonic() + self.flush_interval
+        while True:
+            wake_at = next_tick if deadline is None else min(deadline, next_tick)
+            timeout = max(0.0, wake_at - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # Grava o que ainda estiver na fila antes de sair
+                while True:
+                    try:
+                        pending = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending is not _STOP:
+                        batch.append(pending)
+                for start in range(0, len(batch), self.batch_size):
+                    self._flush(batch[start:start + self.batch_size])
+                return
+
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if time.monotonic() >= next_tick:
+                self._tick()
+                next_tick = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _tick(self):
+        if self.on_tick is None:
+            return
+        try:
+            self.on_tick()
+        except Exception as e:
+            logger.error(f"Erro na tarefa periódica do gravador de logs: {e}")
+
+    def _insert(self, db, inserts, outcome: dict):
+        """
+        Grava os logs, somando as linhas gravadas em `outcome["written"]`. Se uma linha
+        invalidar o lote (ex.: um usuário removido depois do reconhecimento viola a FK),
+        tenta de novo em metades até isolar as linhas com problema, que são descartadas.
+        Outros erros (banco fora do ar) interrompem a gravação do que faltar.
+        """
+        try:
+            db.execute(insert(UserLog), inserts)
+            db.commit()
+            outcome["written"] += len(inserts)
+            return
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            if len(inserts) == 1:
+                logger.error(f"Log de reconhecimento descartado: {inserts[0]}: {e}")
+                return
+        middle = len(inserts) // 2
+        self._insert(db, inserts[:middle], outcome)
+        self._insert(db, inserts[middle:], outcome)
+
+    def _write_inserts(self, inserts) -> Tuple[int, int]:
+        """Devolve (gravados, perdidos)."""
+        outcome = {"written": 0}
+        db = self.session_factory()
+        try:
+            self._insert(db, inserts, outcome)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao gravar lote de {len(inserts)} logs de reconhecimento: {e}")
+        finally:
+            db.close()
+        return outcome["written"], len(inserts) - outcome["written"]
+
+    def _write_hits(self, hits) -> Tuple[int, int]:
+        """
+        Soma os reconhecimentos repetidos nos logs que abriram as janelas. Devolve
+        (aplicadas, perdidas): uma soma que não encontra seu log (o INSERT dele foi
+        descartado) também conta como perdida.
+        """
+        statement = add_hits_statement()
+        db = self.session_factory()
+        try:
+            unmatched = sum(1 for params in add_hits_params(hits) if db.execute(statement, params).rowcount == 0)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao somar {len(hits)} reconhecimentos repetidos nos logs: {e}")
+            return 0, len(hits)
+        finally:
+            db.close()
+        if unmatched:
+            logger.error(f"{unmatched} somas de reconhecimentos repetidos não encontraram o log de origem.")
+        return len(hits) - unmatched, unmatched
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        inserts = [payload for kind, payload in batch if kind == "insert"]
+        hits = [payload for kind, payload in batch if kind == "hits"]
+        # Os INSERTs vêm antes para que as somas de `hits` encontrem suas linhas
+        written, failed = self._write_inserts(inserts) if inserts else (0, 0)
+        hits_applied, hits_failed = self._write_hits(hits) if hits else (0, 0)
+        elapsed = time.perf_counter() - start
+        record_stage("log_flush", elapsed)
+        with self._stats_lock:
+            self._written += written
+            self._failed += failed
+            self._hit_updates += hits_applied
+            self._hit_failures += hits_failed
+            self._flushes += 1
+            self._flush_seconds_total += elapsed
+            self._last_flush_seconds = elapsed
+            self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            return {
+                "running": self.running,
+                "queue_depth": self._queue.qsize(),
+                "written_total": self._written,
+                "dropped_total": self._dropped,
+                "failed_total": self._failed,
+                "hit_updates_total": self._hit_updates,
+                "hit_failures_total": self._hit_failures,
+                "flushes_total": self._flushes,
+                "last_flush_ms": self._last_flush_seconds * 1000,
+                "avg_flush_ms": (self._flush_seconds_total / self._flushes * 1000) if self._flushes else 0.0,
+                "max_flush_ms": self._max_flush_seconds * 1000,
+            }
+
+
+# Instâncias únicas do processo.
+log_writer = UserLogWriter()
+log_dedup = LogDeduplicator(on_hits=log_writer.write_hits)
+log_writer.on_tick = log_dedup.sweep
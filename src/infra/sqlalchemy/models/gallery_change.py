@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, DateTime, String, func
+from ..database import Base
+
+class GalleryChange(Base):
+    # Registro das alterações na galeria de rostos. O maior id é a versão global da
+    # galeria: cada worker aplica só os usuários alterados depois da sua versão.
+    __tablename__ = "gallery_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True) # Sem FK: o registro sobrevive à remoção do usuário
+    op = Column(String(16), nullable=False) # upsert, update, delete ou pruned (marca da poda)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, LargeBinary
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import deferred, relationship
 from ..database import Base
 
+# 1 byte de versão + 128 float32 (ver src/infra/recognition/codec.py).
+# No MySQL fica em VARBINARY para ser guardado junto com a linha.
+ENCODING_COLUMN_TYPE = LargeBinary(513).with_variant(mysql.VARBINARY(513), "mysql")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -9,6 +14,8 @@ class User(Base):
     name = Column(String(255), index=True)
     cellphone = Column(String(20), unique=True, index=True)
     image_path = Column(String(255)) # Caminho para a imagem salva
-    encoding = Column(Text) # Armazenar como string JSON
+    # Encoding facial em formato binário. Adiado: as listagens não precisam dele e a
+    # galeria o carrega com uma consulta própria.
+    encoding = deferred(Column(ENCODING_COLUMN_TYPE))
 
     logs = relationship("UserLog", back_populates="user")
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, func
+from ..database import Base
+from .user import ENCODING_COLUMN_TYPE
+
+class UserEncoding(Base):
+    # Amostras extras do rosto de um usuário (a foto de cadastro fica em users.encoding)
+    __tablename__ = "user_encodings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    encoding = Column(ENCODING_COLUMN_TYPE, nullable=False) # Mesmo formato binário de users.encoding
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
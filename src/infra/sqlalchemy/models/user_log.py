@@ -1,12 +1,19 @@
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 class UserLog(Base):
     __tablename__ = "user_logs"
+    __table_args__ = (
+        # Paginação por cursor em (log_time, id) e filtro por usuário + período
+        Index("ix_user_logs_log_time_id", "log_time", "id"),
+        Index("ix_user_logs_user_id_log_time", "user_id", "log_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     log_time = Column(DateTime(timezone=True), nullable=False)
+    camera_id = Column(String(64), nullable=True) # Câmera que enviou o quadro (X-Camera-Id)
+    hits = Column(Integer, nullable=False, default=1, server_default="1") # Reconhecimentos somados pela janela de de-duplicação
 
     user = relationship("User", back_populates="logs", passive_deletes='all')
@@ -0,0 +1,57 @@
+from typing import List, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from src.infra.sqlalchemy.models.gallery_change import GalleryChange
+
+# `op` da alteração mais antiga que sobra depois da poda
+PRUNED_OP = "pruned"
+
+
+class GalleryChangeRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(self, user_id: int, op: str):
+        """Registra a alteração na mesma transação da mudança no usuário (o commit é de quem chama)."""
+        self.db.add(GalleryChange(user_id=user_id, op=op))
+
+    def record_many(self, user_ids, op: str):
+        self.db.add_all([GalleryChange(user_id=user_id, op=op) for user_id in user_ids])
+
+    def current_version(self) -> int:
+        return int(self.db.query(func.max(GalleryChange.id)).scalar() or 0)
+
+    def changes_after(self, version: int) -> List[Tuple[int, int]]:
+        """
+        (id, user_id) das alterações com id maior que `version`, em ordem de id.
+        Os ids são reservados no INSERT e não no commit, então a lista pode ter
+        lacunas de transações ainda abertas; quem lê decide até onde avançar.
+        """
+        rows = (
+            self.db.query(GalleryChange.id, GalleryChange.user_id)
+            .filter(GalleryChange.id > version)
+            .order_by(GalleryChange.id)
+            .all()
+        )
+        return [(row.id, row.user_id) for row in rows]
+
+    def pruned_through(self) -> int:
+        """
+        Id da marca deixada por `prune` (as alterações até ele já foram apagadas
+        ou descartadas) ou 0 se o registro nunca foi podado.
+        """
+        row = self.db.query(GalleryChange.id, GalleryChange.op).order_by(GalleryChange.id).first()
+        return row.id if row is not None and row.op == PRUNED_OP else 0
+
+    def prune(self, through: int) -> int:
+        """
+        Apaga as alterações anteriores à última com id até `through`, que fica como
+        marca da poda (assim o registro nunca fica vazio e a versão não volta). O
+        commit é de quem chama. Devolve quantas linhas foram apagadas.
+        """
+        mark = self.db.query(func.max(GalleryChange.id)).filter(GalleryChange.id <= through).scalar()
+        if mark is None:
+            return 0
+        deleted = self.db.query(GalleryChange).filter(GalleryChange.id < mark).delete(synchronize_session=False)
+        self.db.query(GalleryChange).filter(GalleryChange.id == mark).update({"op": PRUNED_OP}, synchronize_session=False)
+        return deleted
@@ -1,213 +1,325 @@
-import cv2
-import face_recognition
 import numpy as np
-import json
-import os
 from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from starlette.concurrency import run_in_threadpool
 from  src.infra.sqlalchemy.models.user_log import UserLog
 from ..models.user import User
+from ..models.user_encoding import UserEncoding
 from ..schemas.user import UserCreate
 from src.infra.sqlalchemy.repositories.user_log import UserLogRepository
+from src.infra.sqlalchemy.repositories.gallery_change import GalleryChangeRepository
+from src.infra.sqlalchemy.log_writer import log_writer, log_dedup
+from src.infra.metrics import count_faces, stage, timed
+from src.infra.recognition.gallery import gallery
+from src.infra.recognition.codec import decode_face_encoding, encode_face_encoding
+from src.infra.recognition.templates import USER_MAX_SAMPLES
+from src.infra.recognition import pipeline
+from src.infra.recognition.tracker import CameraTracker
+from src.infra.storage.images import (
+    IMAGE_DIR,
+    discard_staged_image,
+    image_url,
+    prepare_image,
+    publish_staged_image,
+    remove_image,
+    stage_image,
+    user_image_filename,
+    write_image,
+)
 import logging
 
 # Configuração do logger
 logger = logging.getLogger(__name__)
 
-class UserRepository:
-    def __init__(self, db: Session):
-        self.db = db
-        self.IMAGE_DIR = "images" # Certifique-se que esta pasta exista na raiz do projeto
+def _user_response_columns():
+    """Só as colunas de UserResponse: o encoding (e demais colunas grandes) não é lido."""
+    return load_only(User.id, User.name, User.cellphone, User.image_path)
 
-        if not os.path.exists(self.IMAGE_DIR):
-            os.makedirs(self.IMAGE_DIR)
 
-    def get_user(self, user_id: int) -> User:
-        return self.db.query(User).filter(User.id == user_id).first()
+def users_page_statement(
+    limit: int,
+    after_id: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    cellphone_prefix: Optional[str] = None
+):
+    """SELECT de uma página de usuários em ordem de id, com uma linha a mais para saber se há próxima página."""
+    statement = select(User).options(_user_response_columns())
+    if name_prefix:
+        statement = statement.where(User.name.startswith(name_prefix, autoescape=True))
+    if cellphone_prefix:
+        statement = statement.where(User.cellphone.startswith(cellphone_prefix, autoescape=True))
+    if after_id is not None:
+        statement = statement.where(User.id > after_id)
+    return statement.order_by(User.id).limit(limit + 1)
 
-    def get_users(self):
-        return self.db.query(User).all()
 
-    def extract_face_encoding(self, image_file_content: bytes) -> np.ndarray:
+def users_page(users: List[User], limit: int) -> Tuple[List[User], Optional[int]]:
+    if len(users) > limit:
+        users = users[:limit]
+        return users, users[-1].id
+    return users, None
 
-    # Converte os bytes da imagem para um array numpy
-        np_image = np.frombuffer(image_file_content, np.uint8)
-        image_bgr = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
 
-        if image_bgr is None:
-            raise ValueError("Não foi possível decodificar a imagem enviada.")
+class UserRepository:
+    def __init__(self, db: Session):
+        self.db = db
+        self.IMAGE_DIR = IMAGE_DIR
 
-    # Converte BGR para RGB
-        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    def get_user(self, user_id: int) -> User:
+        return self.db.query(User).filter(User.id == user_id).first()
 
-    # Detecta e extrai encodings
-        encodings = face_recognition.face_encodings(image_rgb)
+    def get_users(
+        self,
+        limit: int,
+        after_id: Optional[int] = None,
+        name_prefix: Optional[str] = None,
+        cellphone_prefix: Optional[str] = None
+    ) -> Tuple[List[User], Optional[int]]:
+        """
+        Página de usuários em ordem de id, carregando só as colunas da resposta.
+        A busca por prefixo de nome/celular usa os índices dessas colunas.
+        Devolve os usuários e o id a partir do qual a próxima página começa (ou None).
+        """
+        users = self.db.execute(users_page_statement(limit, after_id, name_prefix, cellphone_prefix)).scalars().all()
+        return users_page(users, limit)
 
-        if not encodings:
-            raise ValueError("Nenhum rosto detectado na imagem fornecida.")
-        if len(encodings) > 1:
-            raise ValueError("Mais de um rosto detectado na imagem. Por favor, forneça uma imagem com apenas um rosto.")
+    def extract_face_encoding(self, image_file_content: bytes) -> np.ndarray:
+        return pipeline.extract_face_encoding(image_file_content)
 
-        return encodings[0]
+    @timed("user_write")
+    def create_user(self, user_data: UserCreate, image_file_content: bytes, face_encoding: Optional[np.ndarray] = None) -> User:
 
-    def create_user(self, user_data: UserCreate, image_file_content: bytes) -> User:
+        # Extrai o encoding facial (a rota já pode tê-lo calculado no pool de processos)
+        if face_encoding is None:
+            face_encoding = self.extract_face_encoding(image_file_content)
 
-        # Extrai o encoding facial
-        face_encoding = self.extract_face_encoding(image_file_content)
+        # Serializa o encoding no formato binário compacto (float32 + versão)
+        encoding_bytes = encode_face_encoding(face_encoding)
 
-        # Converta o encoding numpy array para uma lista e depois para JSON string
-        encoding_str = json.dumps(face_encoding.tolist())
+        # A foto é gravada como chegou (JPEG/PNG), sem decodificar e recomprimir
+        image_bytes, extension = prepare_image(image_file_content)
 
-        # 1. Crie o usuário no banco de dados
         db_user = User(
             name=user_data.name,
             cellphone=user_data.cellphone,
-            encoding=encoding_str,
+            encoding=encoding_bytes,
             image_path=""
         )
         self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
-
-        # 2. Crie o nome do arquivo da imagem
-        image_filename = f"{user_data.name.replace(' ', '_').lower()}_{db_user.id}.jpg"
-        image_path = os.path.join(self.IMAGE_DIR, image_filename)
+        image_filename = None
+        try:
+            # O flush gera o id (usado no nome do arquivo) sem encerrar a transação
+            self.db.flush()
+            image_filename = user_image_filename(user_data.name, db_user.id, extension)
+            write_image(image_filename, image_bytes)
+            db_user.image_path = image_url(image_filename)
+            GalleryChangeRepository(self.db).record(db_user.id, "upsert")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            if image_filename:
+                remove_image(image_url(image_filename))
+            raise
 
-        # 3. Salve a imagem com o nome final
-        np_image = np.frombuffer(image_file_content, np.uint8)
-        image_bgr = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-        cv2.imwrite(image_path, image_bgr)
-
-        # 4. Atualize o caminho da imagem no banco
-        db_user.image_path = f"/images/{image_filename}"
-        self.db.commit()
-        self.db.refresh(db_user)
+        gallery.upsert(db_user, face_encoding)
 
         return db_user
 
 
 
-    def recognize_face(self, image_file_content: bytes, tolerance: float = 0.5) -> dict:
+    def recognize_face(self, image_file_content: bytes, tolerance: float = 0.5, top_k: int = 0) -> dict:
         """
         Recebe uma imagem, detecta todos os rostos e os compara com os usuários cadastrados.
         Retorna um JSON com o status, uma lista de pessoas reconhecidas (com id, nome,
         telefone, caminho da imagem e data/hora de entrada).
+        Com top_k > 0 cada pessoa reconhecida traz também os k candidatos mais próximos.
         """
-        # Carregar todos os usuários do banco de dados
-        users = self.db.query(User).all() 
-
-
-        user_encodings = []
-        user_names = []
-        user_ids = []
-        user_cellphones = []
-        user_image_paths = []
-
-        if not users:
+        if len(gallery.ensure_loaded(self.db)) == 0:
             logger.info("Tentativa de reconhecimento sem usuários cadastrados no banco de dados.")
             return {
                 "status": False,
                 "recognized_people": []
             }
 
-        for user in users:
-            try:
-                # Converte a string JSON do encoding de volta para array numpy
-                encoding_list = json.loads(user.encoding)
-                user_encodings.append(np.array(encoding_list))
-                user_names.append(user.name)
-                user_ids.append(user.id)
-                user_cellphones.append(user.cellphone)
-                user_image_paths.append(user.image_path)
-            except json.JSONDecodeError as e:
-                logger.error(f"Erro ao decodificar encoding para o usuário {user.name} (ID: {user.id}): {e}. Ignorando.")
-                continue
-            except AttributeError as e:
-                logger.error(f"Atributo ausente no usuário {user.name} (ID: {user.id}): {e}. Ignorando.")
-                continue
-            except Exception as e:
-                logger.error(f"Erro inesperado ao processar dados do usuário {user.name} (ID: {user.id}): {e}. Ignorando.")
-                continue
-
-        # Processar a imagem recebida
-        np_image = np.frombuffer(image_file_content, np.uint8)
-        image_bgr = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
+        face_encodings = pipeline.detect_and_encode(image_file_content)
+        return self.recognize_encodings(face_encodings, tolerance=tolerance, top_k=top_k)
 
-        if image_bgr is None:
-            logger.error("Falha ao decodificar a imagem enviada. Imagem pode estar corrompida ou formato inválido.")
-            raise ValueError("Não foi possível decodificar a imagem enviada. Verifique o formato.")
+    def recognize_encodings(
+        self,
+        face_encodings: np.ndarray,
+        tolerance: float = 0.5,
+        top_k: int = 0,
+        camera_id: Optional[str] = None
+    ) -> dict:
+        """
+        Parte do reconhecimento que vem depois da extração dos encodings:
+        compara com a galeria e registra os logs de entrada.
+        """
+        return self.recognize_batch([face_encodings], tolerance=tolerance, top_k=top_k, camera_id=camera_id)[0]
+
+    def recognize_batch(
+        self,
+        batch_encodings: List[np.ndarray],
+        tolerance: float = 0.5,
+        top_k: int = 0,
+        camera_id: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Reconhece os rostos de várias imagens de uma vez: todos os encodings são
+        comparados com a galeria em uma única operação e os logs de entrada são
+        gravados em uma única transação. Os resultados seguem a ordem das imagens.
+        """
+        # Usa a galeria residente em memória (carregada do banco só na primeira vez)
+        with stage("gallery_sync"):
+            snapshot = gallery.ensure_loaded(self.db)
 
-        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(image_rgb)
-        face_encodings = face_recognition.face_encodings(image_rgb, face_locations)
+        if len(snapshot) == 0:
+            logger.info("Tentativa de reconhecimento sem usuários cadastrados no banco de dados.")
+            return [{"status": False, "recognized_people": []} for _ in batch_encodings]
 
         log_time = datetime.now().isoformat()
-        recognized_people_in_image = []
-
-        if not face_encodings:
+        counts = [len(face_encodings) for face_encodings in batch_encodings]
+        if sum(counts) == 0:
             logger.info("Nenhum rosto detectado na imagem fornecida.")
-            return {
-                "status": False,
-                "recognized_people": []
-            }
+            return [{"status": False, "recognized_people": []} for _ in batch_encodings]
+
+        # Compara todos os rostos detectados com a galeria em uma única operação
+        all_encodings = np.vstack([face_encodings for face_encodings in batch_encodings if len(face_encodings)])
+        with stage("match"):
+            snapshot, matches = gallery.match(all_encodings, tolerance, top_k=top_k)
+
+        results = []
+        recognized_people = []
+        offset = 0
+        for count in counts:
+            recognized_people_in_image = []
+            if count == 0:
+                logger.info("Nenhum rosto detectado na imagem fornecida.")
+            for i, match in enumerate(matches[offset:offset + count]):
+                if not match.matched:
+                    logger.info(f"Rosto detectado (índice {i}) não reconhecido.")
+                    continue
+                candidates = self._format_candidates(snapshot, match.candidates) if top_k else None
+                person = self._recognized_person(snapshot, match.row, log_time, candidates)
+                recognized_people_in_image.append(person)
+                logger.info(f"Rosto reconhecido: {person['name']} (ID: {person['id']})")
+            offset += count
+            recognized_people.extend(recognized_people_in_image)
+            results.append({
+                "status": bool(recognized_people_in_image),
+                "recognized_people": recognized_people_in_image
+            })
+
+        count_faces(sum(counts), len(recognized_people))
+        self._register_logs(recognized_people, log_time, camera_id)
+        return results
+
+    def recognize_tracked(
+        self,
+        tracker: CameraTracker,
+        face_locations: list,
+        face_encodings: List[Optional[np.ndarray]],
+        tolerance: float = 0.5,
+        top_k: int = 0,
+        camera_id: Optional[str] = None
+    ) -> dict:
+        """
+        Reconhecimento para câmeras com rastreamento: só os rostos com encoding novo
+        são comparados com a galeria; os demais reaproveitam a identidade do rastro.
+        """
+        with stage("gallery_sync"):
+            snapshot = gallery.ensure_loaded(self.db)
+        log_time = datetime.now().isoformat()
 
-        # Processar cada rosto detectado na imagem
-        for i, face_encoding_to_check in enumerate(face_encodings):
-            # Compara com os encodings dos usuários conhecidos
-            matches = face_recognition.compare_faces(user_encodings, face_encoding_to_check, tolerance=tolerance)
-            face_distances = face_recognition.face_distance(user_encodings, face_encoding_to_check)
-
-            best_match_index = -1
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-
-            if best_match_index != -1 and matches[best_match_index]:
-                recognized_user_name = user_names[best_match_index]
-                recognized_user_id = user_ids[best_match_index]
-                recognized_user_cellphone = user_cellphones[best_match_index]
-                recognized_user_image_path = user_image_paths[best_match_index]
-
-                recognized_people_in_image.append({
-                    "id": recognized_user_id,
-                    "name": recognized_user_name,
-                    "cellphone": recognized_user_cellphone,
-                    "image_path": recognized_user_image_path,
-                    "log_time": log_time
-                })
-                logger.info(f"Rosto reconhecido: {recognized_user_name} (ID: {recognized_user_id})")
-            else:
-                logger.info(f"Rosto detectado (índice {i}) não reconhecido.")
+        tracks = tracker.update(face_locations, [encoding is not None for encoding in face_encodings])
+        to_match = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+        if to_match:
+            with stage("match"):
+                snapshot, matches = gallery.match(np.vstack([face_encodings[i] for i in to_match]), tolerance, top_k=top_k)
+            for i, match in zip(to_match, matches):
+                user_id = int(snapshot.ids[match.row]) if match.matched else None
+                tracks[i].resolve(user_id, self._format_candidates(snapshot, match.candidates))
 
-        final_status = bool(recognized_people_in_image)
-        user_repo_log_repo = UserLogRepository(self.db) # Assumindo que UserLogRepository está disponível
-        #log_time = datetime.now()
-        for person in recognized_people_in_image:
-            try:
-                user_repo_log_repo.create(
-                    user_id=person["id"],
-                    log_time= log_time
-                )
-            except Exception as e:
-                logger.error(f"Erro ao registrar log para o usuário {person['name']} (ID: {person['id']}): {e}")
+        recognized_people_in_image = []
+        for i, track in enumerate(tracks):
+            if track.user_id is None:
+                logger.info(f"Rosto detectado (índice {i}) não reconhecido.")
+                continue
+            row = snapshot.row_of.get(track.user_id)
+            if row is None:
+                # Usuário removido desde que o rastro foi resolvido
+                track.invalidate()
+                continue
+            person = self._recognized_person(snapshot, row, log_time, track.candidates if top_k else None)
+            recognized_people_in_image.append(person)
+            logger.info(f"Rosto reconhecido: {person['name']} (ID: {person['id']})")
 
+        count_faces(len(face_locations), len(recognized_people_in_image))
+        self._register_logs(recognized_people_in_image, log_time, camera_id)
         return {
-            "status": final_status,
+            "status": bool(recognized_people_in_image),
             "recognized_people": recognized_people_in_image
         }
 
+    def _recognized_person(self, snapshot, row: int, log_time: str, candidates: Optional[list] = None) -> dict:
+        person = {
+            "id": int(snapshot.ids[row]),
+            "name": snapshot.names[row],
+            "cellphone": snapshot.cellphones[row],
+            "image_path": snapshot.image_paths[row],
+            "log_time": log_time
+        }
+        if candidates is not None:
+            person["candidates"] = candidates
+        return person
+
+    def _format_candidates(self, snapshot, candidates: list) -> List[dict]:
+        return [
+            {"id": int(snapshot.ids[row]), "name": snapshot.names[row], "distance": distance}
+            for row, distance in candidates
+        ]
+
+    @timed("log_write")
+    def _register_logs(self, recognized_people: List[dict], log_time: str, camera_id: Optional[str] = None):
+        # Reconhecimentos repetidos dentro da janela de de-duplicação não geram outro log
+        log_datetime = datetime.fromisoformat(log_time)
+        to_log = [
+            person for person in recognized_people
+            if log_dedup.should_log(person["id"], log_datetime, camera_id)
+        ]
+        if not to_log:
+            return
+        entries = [(person["id"], log_datetime, camera_id) for person in to_log]
+        # Com o gravador em segundo plano ativo, a resposta não espera o banco
+        if log_writer.submit(entries):
+            return
+        try:
+            UserLogRepository(self.db).create_many(entries)
+        except Exception as e:
+            self.db.rollback()
+            names = ", ".join(f"{person['name']} (ID: {person['id']})" for person in to_log)
+            logger.error(f"Erro ao registrar log para os usuários {names}: {e}")
+
     def delete_user(self, user_id: int):
         user = self.db.query(User).filter(User.id == user_id).first()
         if user:
-            if os.path.exists(user.image_path):
-                os.remove(user.image_path)
+            image_path = user.image_path
         
             self.db.query(UserLog).filter(UserLog.user_id == user_id).delete(synchronize_session=False)
+            self.db.query(UserEncoding).filter(UserEncoding.user_id == user_id).delete(synchronize_session=False)
+            GalleryChangeRepository(self.db).record(user_id, "delete")
 
            
             self.db.delete(user)
 
             
             self.db.commit()
+            remove_image(image_path)
+            gallery.remove(user_id)
+            log_dedup.forget_user(user_id)
             return True
         return False
 
@@ -219,39 +331,57 @@ class UserRepository:
         
         if name:
             user.name = name
+            GalleryChangeRepository(self.db).record(user.id, "update")
         
         self.db.commit()
         self.db.refresh(user)
+        gallery.update_metadata(user)
         return user
     
 
-    def update_user_image(self, user_id: int, image_file_content: bytes):
+    @timed("user_write")
+    def update_user_image(self, user_id: int, image_file_content: bytes, face_encoding: Optional[np.ndarray] = None):
         user = self.db.query(User).filter(User.id == user_id).first()
         if not user:
             return None
         
         # Extrai o novo encoding facial
-        face_encoding = self.extract_face_encoding(image_file_content)
-
-        # Converta o encoding numpy array para uma lista e depois para JSON string
-        encoding_str = json.dumps(face_encoding.tolist())
-
-        # Atualiza o encoding e a imagem do usuário
-        user.encoding = encoding_str
+        if face_encoding is None:
+            face_encoding = self.extract_face_encoding(image_file_content)
 
-        # Cria o nome do arquivo da nova imagem
-        image_filename = f"{user.name.replace(' ', '_').lower()}_{user.id}.jpg"
-        image_path = os.path.join(self.IMAGE_DIR, image_filename)
+        # Serializa o encoding no formato binário compacto (float32 + versão)
+        encoding_bytes = encode_face_encoding(face_encoding)
 
-        # Salva a nova imagem
-        np_image = np.frombuffer(image_file_content, np.uint8)
-        image_bgr = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-        cv2.imwrite(image_path, image_bgr)
+        image_bytes, extension = prepare_image(image_file_content)
+        old_image_path = user.image_path
 
-        user.image_path = f"/images/{image_filename}"
+        # A nova imagem fica num arquivo temporário até o commit: se ele falhar, a
+        # foto atual (que pode ter o mesmo nome) continua intacta
+        image_filename = user_image_filename(user.name, user.id, extension)
+        new_image_path = image_url(image_filename)
+        staged_path = stage_image(image_filename, image_bytes)
 
-        self.db.commit()
-        self.db.refresh(user)
+        user.encoding = encoding_bytes
+        user.image_path = new_image_path
+        GalleryChangeRepository(self.db).record(user.id, "upsert")
+        try:
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            discard_staged_image(staged_path)
+            raise
+
+        try:
+            publish_staged_image(staged_path, image_filename)
+        except OSError as e:
+            discard_staged_image(staged_path)
+            logger.error(f"Não foi possível gravar a nova imagem do usuário {user.id}: {e}")
+        else:
+            if old_image_path and old_image_path != new_image_path:
+                remove_image(old_image_path)
+
+        # O template do usuário é refeito com a nova foto e as amostras extras
+        gallery.upsert(user, [face_encoding] + self._extra_samples(user.id))
 
         return user
 
@@ -262,7 +392,93 @@ class UserRepository:
         
         if cellphone:
             user.cellphone = cellphone
+            GalleryChangeRepository(self.db).record(user.id, "update")
         
         self.db.commit()
         self.db.refresh(user)
-        return user
\ No newline at end of file
+        gallery.update_metadata(user)
+        return user
+
+    # --- Amostras extras de encoding ---
+
+    def _extra_samples(self, user_id: int) -> List[np.ndarray]:
+        rows = self.db.query(UserEncoding.encoding).filter(UserEncoding.user_id == user_id).order_by(UserEncoding.id)
+        return [decode_face_encoding(row.encoding) for row in rows]
+
+    def get_user_samples(self, user_id: int) -> List[UserEncoding]:
+        return (
+            self.db.query(UserEncoding)
+            .options(load_only(UserEncoding.id, UserEncoding.user_id, UserEncoding.created_at))
+            .filter(UserEncoding.user_id == user_id)
+            .order_by(UserEncoding.id)
+            .all()
+        )
+
+    @timed("user_write")
+    def add_user_sample(self, user_id: int, face_encoding: np.ndarray) -> Optional[UserEncoding]:
+        """
+        Guarda mais uma amostra do rosto do usuário (outra iluminação, outro ângulo)
+        e refaz o template dele na galeria.
+        """
+        user = self.db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+
+        # A foto de cadastro (users.encoding) conta como a primeira amostra
+        count = self.db.query(UserEncoding).filter(UserEncoding.user_id == user_id).count() + 1
+        if count >= USER_MAX_SAMPLES:
+            raise ValueError(f"O usuário já tem o máximo de {USER_MAX_SAMPLES} amostras de rosto.")
+
+        sample = UserEncoding(user_id=user_id, encoding=encode_face_encoding(face_encoding))
+        self.db.add(sample)
+        GalleryChangeRepository(self.db).record(user_id, "upsert")
+        self.db.commit()
+        self.db.refresh(sample)
+
+        gallery.upsert(user, [decode_face_encoding(user.encoding)] + self._extra_samples(user_id))
+        return sample
+
+    def delete_user_sample(self, user_id: int, sample_id: int) -> bool:
+        sample = (
+            self.db.query(UserEncoding)
+            .filter(UserEncoding.id == sample_id, UserEncoding.user_id == user_id)
+            .first()
+        )
+        if not sample:
+            return False
+        self.db.delete(sample)
+        GalleryChangeRepository(self.db).record(user_id, "upsert")
+        self.db.commit()
+
+        user = self.db.query(User).filter(User.id == user_id).first()
+        gallery.upsert(user, [decode_face_encoding(user.encoding)] + self._extra_samples(user_id))
+        return True
+
+
+class UserReadRepository:
+    """
+    Leituras de usuários das rotas assíncronas, sem bloquear o event loop: com
+    AsyncSession a consulta é assíncrona; com a Session síncrona, roda no threadpool.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def _execute(self, statement):
+        if isinstance(self.db, AsyncSession):
+            return await self.db.execute(statement)
+        return await run_in_threadpool(self.db.execute, statement)
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        statement = select(User).options(_user_response_columns()).where(User.id == user_id)
+        return (await self._execute(statement)).scalars().first()
+
+    async def get_users(
+        self,
+        limit: int,
+        after_id: Optional[int] = None,
+        name_prefix: Optional[str] = None,
+        cellphone_prefix: Optional[str] = None
+    ) -> Tuple[List[User], Optional[int]]:
+        result = await self._execute(users_page_statement(limit, after_id, name_prefix, cellphone_prefix))
+        return users_page(result.scalars().all(), limit)
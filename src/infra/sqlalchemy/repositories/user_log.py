@@ -1,32 +1,168 @@
+import base64
+from sqlalchemy import and_, bindparam, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from src.infra.sqlalchemy.models.user import User
-from typing import Optional
-from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
 from src.infra.sqlalchemy.models.user_log import UserLog
 
+
+def encode_cursor(log_time: datetime, log_id: int) -> str:
+    raw = f"{log_time.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        log_time, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(log_time), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor de paginação inválido.")
+
+
+def add_hits_statement():
+    """
+    UPDATE que soma reconhecimentos extras no log que abriu a janela de de-duplicação.
+    O horário é comparado com folga de meio segundo porque colunas DATETIME sem
+    fração arredondam os microssegundos (por isso a janela deve ser de 1s ou mais).
+    """
+    table = UserLog.__table__
+    return (
+        table.update()
+        .where(table.c.user_id == bindparam("b_user_id"))
+        .where(table.c.log_time.between(bindparam("b_log_time_from"), bindparam("b_log_time_to")))
+        .where(func.coalesce(table.c.camera_id, "") == bindparam("b_camera_id"))
+        .values(hits=table.c.hits + bindparam("b_extra_hits"))
+    )
+
+
+def add_hits_params(updates) -> list:
+    return [
+        {
+            "b_user_id": user_id,
+            "b_log_time_from": log_time - timedelta(milliseconds=500),
+            "b_log_time_to": log_time + timedelta(milliseconds=500),
+            "b_camera_id": camera_id or "",
+            "b_extra_hits": extra_hits,
+        }
+        for user_id, log_time, camera_id, extra_hits in updates
+    ]
+
+def _user_log_statement(user_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    statement = select(
+        UserLog.id.label("log_id"),
+        UserLog.user_id,
+        UserLog.log_time,
+        User.name.label("user_name"), 
+        User.image_path.label("user_image_path"),
+        UserLog.camera_id,
+        UserLog.hits
+    ).join(User, UserLog.user_id == User.id)
+
+    if user_id is not None:
+        statement = statement.where(UserLog.user_id == user_id)
+    if start is not None:
+        statement = statement.where(UserLog.log_time >= start)
+    if end is not None:
+        statement = statement.where(UserLog.log_time < end)
+    return statement
+
+
+def _format_row(row) -> dict:
+    return {
+        "id": row.log_id,
+        "user_id": row.user_id,
+        "user_name": row.user_name,     
+        "user_image_path": row.user_image_path,
+        "log_time": row.log_time.isoformat() if row.log_time else None,
+        "camera_id": row.camera_id,
+        "hits": row.hits
+    }
+
+
+def user_log_page_statement(
+    limit: int,
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    SELECT de uma página de logs, do mais recente para o mais antigo, paginada por
+    cursor sobre (log_time, id). Traz uma linha a mais para saber se há próxima página.
+    """
+    statement = _user_log_statement(user_id, start, end)
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            UserLog.log_time < cursor_time,
+            and_(UserLog.log_time == cursor_time, UserLog.id < cursor_id)
+        ))
+    return statement.order_by(UserLog.log_time.desc(), UserLog.id.desc()).limit(limit + 1)
+
+
+def user_log_page(rows, limit: int) -> Tuple[List[dict], Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].log_time, rows[-1].log_id)
+    return [_format_row(row) for row in rows], next_cursor
+
+
 class UserLogRepository:
     def __init__(self, db: Session):
         self.db = db
 
     def get_user_log_with_user_data(self):
- 
-        results = self.db.query(
-            UserLog.id.label("user_id"), 
+        return [_format_row(row) for row in self.db.execute(_user_log_statement()).all()]
+
+    def get_user_log_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Página de logs, do mais recente para o mais antigo, paginada por cursor
+        sobre (log_time, id). Cada página custa o mesmo, independente do tamanho
+        do histórico. Devolve os itens e o cursor da próxima página (ou None).
+        """
+        rows = self.db.execute(user_log_page_statement(limit, cursor, user_id, start, end)).all()
+        return user_log_page(rows, limit)
+
+    def iter_user_logs(
+        self,
+        chunk_size: int,
+        user_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ):
+        """
+        Percorre o histórico completo em ordem cronológica sem carregá-lo em memória:
+        usa cursor do lado do servidor (stream_results) e busca `chunk_size` linhas por vez.
+        """
+        query = self.db.query(
+            UserLog.id,
+            UserLog.user_id,
+            User.name.label("user_name"),
             UserLog.log_time,
-            User.name.label("user_name"), 
-            User.image_path.label("user_image_path") 
-        ).join(User, UserLog.user_id == User.id).all()
+            UserLog.camera_id,
+            UserLog.hits
+        ).join(User, UserLog.user_id == User.id)
 
+        if user_id is not None:
+            query = query.filter(UserLog.user_id == user_id)
+        if start is not None:
+            query = query.filter(UserLog.log_time >= start)
+        if end is not None:
+            query = query.filter(UserLog.log_time < end)
 
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                "user_id": row.user_id,      
-                "user_name": row.user_name,     
-                "user_image_path": row.user_image_path,
-                "log_time": row.log_time.isoformat() if row.log_time else None
-            })
-        return formatted_results
+        return query.order_by(UserLog.log_time, UserLog.id).yield_per(chunk_size)
 
     def create(self, user_id: int, log_time: datetime):
         if isinstance(log_time, str):
@@ -40,3 +176,48 @@ class UserLogRepository:
         self.db.commit()
         self.db.refresh(new_log)
         return new_log
+
+    def create_many(self, entries: Iterable[Tuple[int, datetime, Optional[str]]]):
+        """Grava vários logs de entrada (user_id, log_time, camera_id) em uma única transação."""
+        new_logs = [
+            UserLog(
+                user_id=user_id,
+                log_time=datetime.fromisoformat(log_time) if isinstance(log_time, str) else log_time,
+                camera_id=camera_id
+            )
+            for user_id, log_time, camera_id in entries
+        ]
+        self.db.add_all(new_logs)
+        self.db.commit()
+        return new_logs
+
+    def add_hits(self, updates):
+        """Soma os reconhecimentos suprimidos pela janela de de-duplicação."""
+        self.db.execute(add_hits_statement(), add_hits_params(updates))
+        self.db.commit()
+
+
+class UserLogReadRepository:
+    """
+    Leituras de logs das rotas assíncronas, sem bloquear o event loop: com
+    AsyncSession a consulta é assíncrona; com a Session síncrona, roda no threadpool.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def _execute(self, statement):
+        if isinstance(self.db, AsyncSession):
+            return await self.db.execute(statement)
+        return await run_in_threadpool(self.db.execute, statement)
+
+    async def get_user_log_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        rows = (await self._execute(user_log_page_statement(limit, cursor, user_id, start, end))).all()
+        return user_log_page(rows, limit)
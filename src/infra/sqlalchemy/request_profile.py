@@ -0,0 +1,53 @@
+from typing import AsyncIterator, Optional
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .auth import get_admin_from_token
+from .database import get_db
+from src.infra.profiling import PROFILE_HEADER, RequestProfile, profile_store
+
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+async def profile_id_middleware(request: Request, call_next):
+    """Repete o X-Profile-Id em qualquer resposta, inclusive as de erro, que são as que mais interessam."""
+    response = await call_next(request)
+    profile_id = getattr(request.state, "profile_id", None)
+    if profile_id is not None and PROFILE_ID_HEADER not in response.headers:
+        response.headers[PROFILE_ID_HEADER] = profile_id
+    return response
+
+
+async def get_request_profile(request: Request, response: Response, db: Session = Depends(get_db)) -> AsyncIterator[Optional[RequestProfile]]:
+    """
+    Dependência das rotas de reconhecimento e cadastro: abre o perfil da requisição
+    quando um administrador envia o cabeçalho X-Profile (com o token de acesso) ou
+    quando a requisição é sorteada por PROFILE_SAMPLE_RATE. O perfil é gravado
+    ao final da requisição e o id volta no cabeçalho X-Profile-Id (também nas
+    respostas de erro, via `profile_id_middleware`).
+    """
+    requested = request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+    if requested:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or await run_in_threadpool(get_admin_from_token, token, db) is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="O perfil da requisição exige o token de um administrador.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    profile = profile_store.start(request.url.path, requested)
+    if profile is None:
+        yield None
+        return
+    response.headers[PROFILE_ID_HEADER] = profile.id
+    # O Response injetado é descartado quando a rota lança HTTPException; o middleware usa este valor
+    request.state.profile_id = profile.id
+    failed = False
+    try:
+        yield profile
+    except Exception:
+        failed = True
+        raise
+    finally:
+        await run_in_threadpool(profile_store.finish, profile, "error" if failed else "ok")
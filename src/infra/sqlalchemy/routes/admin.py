@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from ..database import get_db
@@ -36,8 +37,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             detail="Username and password are required",
         )   
     admin_repo = AdminRepository(db)
-    admin = admin_repo.get_admin_by_name(form_data.username)
-    if not admin or not verify_password(form_data.password, admin.hashed_password):
+    admin = await run_in_threadpool(admin_repo.get_admin_by_name, form_data.username)
+    # A verificação do bcrypt é lenta de propósito; roda fora do event loop
+    if not admin or not await run_in_threadpool(verify_password, form_data.password, admin.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -0,0 +1,45 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse
+from src.infra.storage.images import THUMBNAIL_SIZES, etags, resolve_image, thumbnail
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+# Tempo que o navegador pode usar a imagem sem revalidar. Os nomes dos arquivos
+# não mudam quando a foto é trocada, então depois disso vale a revalidação por ETag.
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "300"))
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+def get_image_endpoint(
+    filename: str,
+    request: Request,
+    size: Optional[int] = Query(None, description=f"Miniatura: {', '.join(map(str, THUMBNAIL_SIZES))}"),
+):
+    """
+    Serve as fotos de cadastro. Com `size` devolve uma miniatura (gerada e guardada
+    em disco no primeiro pedido). Responde 304 quando o ETag do cliente ainda vale.
+    """
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tamanho de miniatura inválido. Use um de: {', '.join(map(str, THUMBNAIL_SIZES))}",
+        )
+
+    path = thumbnail(filename, size) if size else resolve_image(filename)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    etag = etags.get(path)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, headers=headers)
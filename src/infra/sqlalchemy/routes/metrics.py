@@ -0,0 +1,67 @@
+import hmac
+import logging
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from ..auth import admin_tokens
+from ..database import engine
+from ..log_writer import log_dedup, log_writer
+from src.infra.metrics import CONTENT_TYPE, registry
+from src.infra.recognition.gallery import gallery
+from src.infra.recognition.workers import recognition_pool
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Metrics"])
+
+# Com METRICS_TOKEN definido, o coletor precisa enviar `Authorization: Bearer <token>`.
+# Sem ele (padrão), /metrics é público: defina-o em produção ou bloqueie a rota no proxy.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+if not METRICS_TOKEN:
+    logger.warning("METRICS_TOKEN não definido: /metrics está acessível sem autenticação.")
+
+
+# --- Valores lidos na hora da coleta ---
+registry.gauge("facerec_recognition_pool_size", "Processos do pool de reconhecimento.",
+               function=lambda: recognition_pool.size)
+registry.gauge("facerec_recognition_pool_pending", "Imagens aguardando ou em processamento no pool.",
+               function=lambda: recognition_pool.pending)
+registry.gauge("facerec_recognition_pool_queue_depth", "Máximo de imagens aceitas no pool antes de recusar (503).",
+               function=lambda: recognition_pool.queue_depth)
+registry.gauge("facerec_log_writer_queue_depth", "Eventos na fila do gravador de logs.",
+               function=lambda: log_writer.metrics()["queue_depth"])
+registry.counter("facerec_log_writer_written_total", "Logs gravados pelo gravador em segundo plano.",
+                 function=lambda: log_writer.metrics()["written_total"])
+registry.counter("facerec_log_writer_dropped_total", "Logs descartados com a fila do gravador cheia.",
+                 function=lambda: log_writer.metrics()["dropped_total"])
+registry.counter("facerec_log_writer_failed_total", "Logs perdidos por erro na gravação em lote.",
+                 function=lambda: log_writer.metrics()["failed_total"])
+registry.counter("facerec_log_writer_hit_failures_total", "Somas de reconhecimentos repetidos perdidas (erro ou log de origem ausente).",
+                 function=lambda: log_writer.metrics()["hit_failures_total"])
+registry.counter("facerec_log_dedup_suppressed_total", "Reconhecimentos repetidos que não geraram log.",
+                 function=lambda: log_dedup.suppressed_total)
+registry.gauge("facerec_gallery_users", "Usuários na galeria em memória.",
+               function=lambda: gallery.snapshot().user_count)
+registry.gauge("facerec_gallery_rows", "Encodings (amostras) na galeria em memória.",
+               function=lambda: len(gallery.snapshot()))
+registry.counter("facerec_admin_token_cache_hits_total", "Requisições de administrador validadas pelo cache de tokens.",
+                 function=lambda: admin_tokens.hits)
+registry.counter("facerec_admin_token_cache_misses_total", "Requisições de administrador que validaram o token no banco.",
+                 function=lambda: admin_tokens.misses)
+registry.gauge("facerec_db_pool_checked_out", "Conexões do pool do banco em uso.",
+               function=lambda: engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 0)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics_endpoint(authorization: Optional[str] = Header(None)):
+    """
+    Métricas do processo no formato de texto do Prometheus: tempos por etapa,
+    rostos detectados/reconhecidos, tempos do banco e estado do pool e da fila de logs.
+    Com vários workers do uvicorn, cada resposta traz as métricas do worker que a
+    atendeu, com o rótulo `worker` (pid); some as séries no Prometheus.
+    Sem METRICS_TOKEN a rota não exige autenticação.
+    """
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido.")
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
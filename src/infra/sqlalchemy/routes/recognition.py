@@ -1,25 +1,263 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+import asyncio
+import logging
+import os
+import struct
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
-from ..database import get_db
+from typing import List, Optional, Tuple
+from ..database import get_db, SessionLocal
 from ..repositories.user import UserRepository
+from ..request_profile import get_request_profile
+from ..auth import get_current_admin
+from ..models.admin import Admin as AdminModel
 from fastapi import Request
+from fastapi.responses import FileResponse
+from src.infra.recognition.pipeline import detect_and_encode, detect_and_encode_tracked
+from src.infra.recognition.tracker import trackers
+from src.infra.recognition.workers import recognition_pool, QueueFullError
+from src.infra.profiling import RequestProfile, profile_store, profiled_call
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/recognition", tags=["Face Recognition"])
 
+# Limite de imagens aceitas em uma única requisição de lote
+RECOGNITION_BATCH_MAX_IMAGES = int(os.getenv("RECOGNITION_BATCH_MAX_IMAGES", "16"))
+# Quantos quadros já detectados podem aguardar a etapa de comparação no streaming
+STREAM_PIPELINE_DEPTH = int(os.getenv("STREAM_PIPELINE_DEPTH", "1"))
+
 @router.post("/recognize", summary="Reconhecer um rosto a partir de uma imagem (RAW JPEG)", response_model=dict)
-async def recognize_face_endpoint(request: Request, db: Session = Depends(get_db)):
+async def recognize_face_endpoint(
+    request: Request,
+    top_k: int = Query(0, ge=0, le=20, description="Quantidade de candidatos mais próximos a retornar por pessoa reconhecida"),
+    db: Session = Depends(get_db),
+    profile: Optional[RequestProfile] = Depends(get_request_profile)
+):
     """
     Novo endpoint que aceita imagem RAW (Content-Type: image/jpeg) diretamente no corpo da requisição.
     Compatível com a ESP-CAM.
+    Com o cabeçalho `X-Camera-Id`, os rostos são rastreados entre quadros da mesma câmera
+    e só rostos novos (ou a cada TRACK_REENCODE_INTERVAL quadros) são codificados.
+    Com `X-Profile: 1` e o token de um administrador, a requisição é perfilada
+    (cProfile) e o perfil fica em PROFILE_DIR; o id volta em `X-Profile-Id`.
     """
     user_repo = UserRepository(db)
+    camera_id = request.headers.get("x-camera-id")
     try:
         # Lê os bytes brutos enviados pela ESP-CAM
         image_content = await request.body()
-        result = user_repo.recognize_face(image_content)
+        if camera_id:
+            tracker = trackers.get(camera_id)
+            face_locations, face_encodings = await recognition_pool.run(
+                detect_and_encode_tracked, image_content, tracker.reusable_boxes(), profile=profile
+            )
+            # Comparação e logs (que podem consultar o banco) fora do event loop
+            return await run_in_threadpool(
+                profiled_call, profile, user_repo.recognize_tracked, tracker, face_locations, face_encodings, top_k=top_k, camera_id=camera_id
+            )
+
+        # Decodificação, detecção e encodings rodam no pool de processos
+        face_encodings = await recognition_pool.run(detect_and_encode, image_content, profile=profile)
+        result = await run_in_threadpool(
+            profiled_call, profile, user_repo.recognize_encodings, face_encodings, top_k=top_k, camera_id=camera_id
+        )
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
+
+
+async def _read_batch_images(request: Request) -> List[bytes]:
+    """
+    Lê as imagens do lote. Aceita multipart/form-data (campo `images`, repetido)
+    ou um fluxo binário em que cada imagem vem precedida do seu tamanho
+    (4 bytes, big-endian).
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        return [await item.read() for item in form.getlist("images") if hasattr(item, "read")]
+
+    body = await request.body()
+    images, offset = [], 0
+    while offset < len(body):
+        if offset + 4 > len(body):
+            raise ValueError("Fluxo binário truncado: cabeçalho de tamanho incompleto.")
+        (size,) = struct.unpack_from(">I", body, offset)
+        offset += 4
+        if offset + size > len(body):
+            raise ValueError("Fluxo binário truncado: imagem incompleta.")
+        images.append(body[offset:offset + size])
+        offset += size
+    return images
+
+
+@router.post("/recognize/batch", summary="Reconhecer rostos em várias imagens de uma vez", response_model=dict)
+async def recognize_batch_endpoint(
+    request: Request,
+    top_k: int = Query(0, ge=0, le=20, description="Quantidade de candidatos mais próximos a retornar por pessoa reconhecida"),
+    db: Session = Depends(get_db)
+):
+    """
+    Recebe várias imagens (multipart `images` ou fluxo binário com prefixo de tamanho),
+    processa todas em paralelo, compara todos os rostos com a galeria de uma vez e
+    grava os logs em uma única transação. `results` segue a ordem das imagens enviadas.
+    """
+    user_repo = UserRepository(db)
+    try:
+        images = await _read_batch_images(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not images:
+        raise HTTPException(status_code=400, detail="Nenhuma imagem enviada.")
+    if len(images) > RECOGNITION_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {RECOGNITION_BATCH_MAX_IMAGES} imagens por requisição."
+        )
+    if not recognition_pool.has_capacity(len(images)):
+        raise HTTPException(status_code=503, detail="Fila de reconhecimento cheia. Tente novamente em instantes.")
+
+    try:
+        outcomes = await asyncio.gather(
+            *(recognition_pool.run(detect_and_encode, image) for image in images),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException) and not isinstance(outcome, ValueError):
+                raise outcome
+
+        decoded = [outcome for outcome in outcomes if not isinstance(outcome, ValueError)]
+        recognized = iter(await run_in_threadpool(
+            user_repo.recognize_batch, decoded, top_k=top_k, camera_id=request.headers.get("x-camera-id")
+        ))
+
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, ValueError):
+                results.append({"status": False, "recognized_people": [], "error": str(outcome)})
+            else:
+                results.append(next(recognized))
+        return {"results": results}
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {e}")
+
+
+
+class _LatestFrame:
+    """
+    Guarda apenas o quadro mais recente recebido da câmera. Se o processamento
+    ficar para trás, os quadros antigos são descartados em vez de enfileirados.
+    """
+
+    def __init__(self):
+        self._frame: Optional[Tuple[int, bytes]] = None
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, seq: int, content: bytes):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (seq, content)
+        self._ready.set()
+
+    async def take(self) -> Tuple[int, bytes]:
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+def _match_frame(face_encodings, top_k: int, camera_id: Optional[str]) -> dict:
+    # Cada quadro usa uma sessão curta, para não prender uma conexão do pool
+    # durante toda a vida do websocket.
+    db = SessionLocal()
+    try:
+        return UserRepository(db).recognize_encodings(face_encodings, top_k=top_k, camera_id=camera_id)
+    finally:
+        db.close()
+
+
+@router.websocket("/stream")
+async def recognize_stream_endpoint(websocket: WebSocket, top_k: int = 0, camera_id: Optional[str] = None):
+    """
+    Reconhecimento contínuo para câmeras. A câmera mantém o websocket aberto e envia
+    cada quadro JPEG como mensagem binária; o servidor responde com um evento JSON
+    por quadro processado (`frame`, `status`, `recognized_people`, `dropped`).
+    A câmera pode se identificar com `?camera_id=` (ou o cabeçalho X-Camera-Id) para os logs.
+
+    Decodificação/detecção (pool de processos) e comparação/log (thread) rodam em
+    paralelo; quando o processamento fica para trás só o quadro mais recente é mantido.
+    """
+    camera_id = camera_id or websocket.headers.get("x-camera-id")
+    await websocket.accept()
+    latest = _LatestFrame()
+    detected: asyncio.Queue = asyncio.Queue(maxsize=max(1, STREAM_PIPELINE_DEPTH))
+
+    async def receive_frames():
+        seq = 0
+        while True:
+            content = await websocket.receive_bytes()
+            seq += 1
+            latest.put(seq, content)
+
+    async def detect_frames():
+        while True:
+            seq, content = await latest.take()
+            try:
+                face_encodings = await recognition_pool.run(detect_and_encode, content)
+            except (ValueError, QueueFullError) as e:
+                await detected.put((seq, None, str(e)))
+                continue
+            await detected.put((seq, face_encodings, None))
+
+    async def match_frames():
+        while True:
+            seq, face_encodings, error = await detected.get()
+            if error is not None:
+                event = {"frame": seq, "status": False, "recognized_people": [], "error": error}
+            else:
+                event = {"frame": seq, **await run_in_threadpool(_match_frame, face_encodings, top_k, camera_id)}
+            event["dropped"] = latest.dropped
+            await websocket.send_json(event)
+
+    tasks = [asyncio.create_task(stage()) for stage in (receive_frames, detect_frames, match_frames)]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"Erro no streaming de reconhecimento: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.get("/profiles", response_model=List[dict])
+def list_profiles_endpoint(current_admin: AdminModel = Depends(get_current_admin)):
+    """Perfis de requisições gravados neste servidor, do mais recente para o mais antigo."""
+    return profile_store.summaries()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile_endpoint(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|prof)$", description="json (resumo) ou prof (estatísticas do cProfile)"),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    """Resumo de um perfil ou o arquivo `.prof` para abrir com pstats/snakeviz."""
+    path = profile_store.find(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil não encontrado.")
+    if format == "prof":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    return FileResponse(path, media_type="application/json")
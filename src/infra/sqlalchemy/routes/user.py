@@ -1,50 +1,115 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+import os
+import shutil
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..database import get_db
-from ..schemas.user import UserCreate, UserResponse
-from ..repositories.user import UserRepository
+from ..database import get_db, get_read_db
+from ..schemas.user import UserCreate, UserResponse, UserEncodingResponse
+from ..repositories.user import UserReadRepository, UserRepository
 from ..auth import get_current_admin
+from ..request_profile import get_request_profile
 from ..models.admin import Admin as AdminModel 
+from src.infra.recognition.pipeline import extract_face_encoding
+from src.infra.recognition.workers import recognition_pool, QueueFullError
+from src.infra.profiling import RequestProfile, profiled_call
+from ..user_import import import_jobs
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Tamanho de página padrão e máximo da listagem de usuários
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "1000"))
+
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user_endpoint(
     name: str = Form(...),
     cellphone: str = Form(...),
     image_file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_admin: AdminModel = Depends(get_current_admin)
+    current_admin: AdminModel = Depends(get_current_admin),
+    profile: Optional[RequestProfile] = Depends(get_request_profile)
 ) -> UserResponse:
     """
     Cria um novo usuário com reconhecimento facial e armazena as suas informações no banco de dados.
     O arquivo de imagem deve ser enviado como um arquivo multipart/form-data.
     Apenas administradores autenticados podem usar esta rota.
+    Com o cabeçalho `X-Profile: 1` a requisição é perfilada (id em `X-Profile-Id`).
     """
     user_repo = UserRepository(db)
     try:
         user_data = UserCreate(name=name, cellphone=cellphone)
         image_content = await image_file.read()
-        new_user = user_repo.create_user(user_data, image_content)
+        face_encoding = await recognition_pool.run(extract_face_encoding, image_content, profile=profile)
+        # Gravação da foto e transação fora do event loop
+        new_user = await run_in_threadpool(profiled_call, profile, user_repo.create_user, user_data, image_content, face_encoding)
         return new_user
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao criar usuário: {e}")
 
+def _save_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
+
+
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED, response_model=dict)
+async def import_users_endpoint(
+    archive: UploadFile = File(..., description="ZIP com as imagens (e o manifest.csv, se não for enviado à parte)"),
+    manifest: Optional[UploadFile] = File(None, description="CSV com as colunas name, cellphone, image"),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    """
+    Inicia a importação em lote de usuários e devolve o id do job.
+    O andamento e os erros por linha são consultados em GET /users/import/{job_id}.
+    """
+    job_id = import_jobs.new_job_id()
+    archive_path = os.path.join(import_jobs.job_dir(job_id), "archive.zip")
+    manifest_path = os.path.join(import_jobs.job_dir(job_id), "manifest.csv") if manifest else None
+    await run_in_threadpool(_save_upload, archive, archive_path)
+    if manifest:
+        await run_in_threadpool(_save_upload, manifest, manifest_path)
+    import_jobs.start(job_id, archive_path, manifest_path)
+    return {"job_id": job_id, "status": "running"}
+
+
+@router.get("/import/{job_id}", response_model=dict)
+def get_import_status_endpoint(job_id: str, current_admin: AdminModel = Depends(get_current_admin)):
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job
+
+
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user_endpoint(user_id: int, db: Session = Depends(get_db), current_admin: AdminModel = Depends(get_current_admin)):
-    user_repo = UserRepository(db)
-    user = user_repo.get_user(user_id)
+async def get_user_endpoint(user_id: int, db=Depends(get_read_db), current_admin: AdminModel = Depends(get_current_admin)):
+    user = await UserReadRepository(db).get_user(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
 @router.get("/", response_model=List[UserResponse])
-def get_all_users_endpoint(db: Session = Depends(get_db), current_admin: AdminModel = Depends(get_current_admin)):
-    user_repo = UserRepository(db)
-    users = user_repo.get_users() 
+async def get_all_users_endpoint(
+    response: Response,
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, description="Valor de X-Next-Cursor da página anterior"),
+    name: Optional[str] = Query(None, description="Prefixo do nome"),
+    cellphone: Optional[str] = Query(None, description="Prefixo do celular"),
+    db=Depends(get_read_db),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    """
+    Lista os usuários em ordem de id, paginados por cursor (USERS_PAGE_SIZE por
+    página). Quando há mais páginas, o cursor da próxima vem no cabeçalho
+    `X-Next-Cursor`, liberado para o frontend no CORS (main.py); para ler todos os
+    usuários, repita a chamada com `cursor` até o cabeçalho não vir.
+    """
+    users, next_cursor = await UserReadRepository(db).get_users(limit, cursor, name, cellphone)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return users
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -80,16 +145,27 @@ async def update_user_image_endpoint(
     user_id: int,
     image_file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_admin: AdminModel = Depends(get_current_admin)
+    current_admin: AdminModel = Depends(get_current_admin),
+    profile: Optional[RequestProfile] = Depends(get_request_profile)
 ):
     user_repo = UserRepository(db)
     try:
-        update_user_image_endpoint = user_repo.update_user_image(user_id, await image_file.read())
+        if not await run_in_threadpool(user_repo.get_user, user_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        image_content = await image_file.read()
+        face_encoding = await recognition_pool.run(extract_face_encoding, image_content, profile=profile)
+        update_user_image_endpoint = await run_in_threadpool(
+            profiled_call, profile, user_repo.update_user_image, user_id, image_content, face_encoding
+        )
         if not update_user_image_endpoint:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         return update_user_image_endpoint
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) 
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error updating user image: {e}")
     
@@ -110,4 +186,56 @@ def update_user_cellphone_endpoint(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error updating user cellphone: {e}")    
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error updating user cellphone: {e}")
+
+
+@router.get("/{user_id}/encodings", response_model=List[UserEncodingResponse])
+def get_user_samples_endpoint(user_id: int, db: Session = Depends(get_db), current_admin: AdminModel = Depends(get_current_admin)):
+    user_repo = UserRepository(db)
+    if not user_repo.get_user(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user_repo.get_user_samples(user_id)
+
+
+@router.post("/{user_id}/encodings", response_model=UserEncodingResponse, status_code=status.HTTP_201_CREATED)
+async def add_user_sample_endpoint(
+    user_id: int,
+    image_file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_admin: AdminModel = Depends(get_current_admin),
+    profile: Optional[RequestProfile] = Depends(get_request_profile)
+):
+    """
+    Adiciona mais uma amostra do rosto do usuário (a imagem deve ter um único rosto).
+    Várias amostras (iluminações e ângulos diferentes) aumentam a taxa de acerto no primeiro quadro.
+    """
+    user_repo = UserRepository(db)
+    try:
+        if not await run_in_threadpool(user_repo.get_user, user_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        image_content = await image_file.read()
+        face_encoding = await recognition_pool.run(extract_face_encoding, image_content, profile=profile)
+        sample = await run_in_threadpool(profiled_call, profile, user_repo.add_user_sample, user_id, face_encoding)
+        if not sample:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return sample
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error adding user encoding: {e}")
+
+
+@router.delete("/{user_id}/encodings/{sample_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_user_sample_endpoint(
+    user_id: int,
+    sample_id: int,
+    db: Session = Depends(get_db),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    user_repo = UserRepository(db)
+    if not user_repo.delete_user_sample(user_id, sample_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Encoding sample not found")
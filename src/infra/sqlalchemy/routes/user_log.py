@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends
+import os
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from typing import List, Optional
+from ..database import get_db, get_read_db
 from ..schemas.user_log import UserLogResponse, UserLog
-from ..repositories.user_log import UserLogRepository
+from ..repositories.user_log import UserLogReadRepository, UserLogRepository
+from ..log_writer import log_writer, log_dedup
+from ..log_export import EXPORT_MEDIA_TYPES, export_user_logs
 from ..auth import get_current_admin
 from ..models.admin import Admin as AdminModel
 
 router = APIRouter(prefix="/users_log", tags=["UsersLog"])
 
+# Tamanho de página padrão e máximo da listagem de logs
+USERS_LOG_PAGE_SIZE = int(os.getenv("USERS_LOG_PAGE_SIZE", "100"))
+USERS_LOG_MAX_PAGE_SIZE = int(os.getenv("USERS_LOG_MAX_PAGE_SIZE", "1000"))
+
 
 
 @router.post("/", response_model=UserLog, status_code=201)
@@ -27,7 +36,62 @@ def create_user_log_endpoint(
 
 
 @router.get("/", response_model=List[UserLogResponse])
-def get_user_log_endpoint(db: Session = Depends(get_db),current_admin: AdminModel = Depends(get_current_admin)):
-    user_log_repo = UserLogRepository(db)
-    user_logs = user_log_repo.get_user_log_with_user_data()
+async def get_user_log_endpoint(
+    response: Response,
+    limit: int = Query(USERS_LOG_PAGE_SIZE, ge=1, le=USERS_LOG_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor da página anterior"),
+    user_id: Optional[int] = Query(None),
+    start: Optional[datetime] = Query(None, description="Logs a partir deste horário (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Logs antes deste horário"),
+    db=Depends(get_read_db),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    """
+    Lista os logs do mais recente para o mais antigo, paginados por cursor
+    (USERS_LOG_PAGE_SIZE por página). Quando há mais páginas, o cursor da próxima
+    vem no cabeçalho `X-Next-Cursor`, liberado para o frontend no CORS (main.py);
+    para ler todos os logs, repita a chamada com `cursor` até o cabeçalho não vir.
+    """
+    try:
+        user_logs, next_cursor = await UserLogReadRepository(db).get_user_log_page(limit, cursor, user_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return user_logs
+
+
+@router.get("/export")
+def export_user_log_endpoint(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = Query(False, description="Compacta a exportação com gzip"),
+    user_id: Optional[int] = Query(None),
+    start: Optional[datetime] = Query(None, description="Logs a partir deste horário (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Logs antes deste horário"),
+    current_admin: AdminModel = Depends(get_current_admin)
+):
+    """
+    Exporta o histórico de logs em ordem cronológica, em CSV ou NDJSON.
+    As linhas são lidas do banco e enviadas aos poucos, sem montar a lista em memória.
+    """
+    filename = f"users_log.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_user_logs(format, gzip, user_id, start, end),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/writer/metrics", response_model=dict)
+def get_log_writer_metrics_endpoint(current_admin: AdminModel = Depends(get_current_admin)):
+    """
+    Métricas do gravador de logs em segundo plano: profundidade da fila,
+    registros gravados/descartados, latência das gravações em lote e
+    reconhecimentos suprimidos pela janela de de-duplicação.
+    """
+    return {
+        **log_writer.metrics(),
+        "dedup_window_seconds": log_dedup.window_seconds,
+        "dedup_open_windows": len(log_dedup),
+        "dedup_suppressed_total": log_dedup.suppressed_total,
+    }
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, AfterValidator, ValidationError
+from datetime import datetime
 from typing import Optional, Annotated
 from src.infra.sqlalchemy.models.validators.validators import is_char, is_digit
 
@@ -19,4 +20,14 @@ class UserResponse(UserBase):
     
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class UserEncodingResponse(BaseModel):
+    # Amostra extra de encoding facial de um usuário
+    id: int
+    user_id: int
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
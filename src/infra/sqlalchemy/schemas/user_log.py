@@ -13,10 +13,13 @@ class UserLog(BaseModel):
 
 
 class UserLogResponse(BaseModel):
+    id: int
     user_id: int
     log_time: Optional[datetime] = None
     user_name: Annotated[str, AfterValidator(is_char)] 
     user_image_path:str
+    camera_id: Optional[str] = None
+    hits: Optional[int] = None
 
     class Config:
         from_attributes = True
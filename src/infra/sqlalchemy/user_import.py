@@ -0,0 +1,400 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from .database import SessionLocal
+from .models.user import User
+from .repositories.gallery_change import GalleryChangeRepository
+from .schemas.user import UserCreate
+from src.infra.recognition.codec import encode_face_encoding
+from src.infra.recognition.gallery import gallery
+from src.infra.recognition.pipeline import extract_face_encoding
+from src.infra.recognition.workers import RecognitionPool, recognition_pool
+from src.infra.storage.images import image_url, prepare_image, remove_image, user_image_filename, write_image
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração da importação em lote ---
+# Usuários gravados por transação
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "100"))
+# Pasta onde a rota guarda os arquivos enviados e o estado de cada importação
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join("data", "imports"))
+IMPORT_MAX_JOBS = int(os.getenv("IMPORT_MAX_JOBS", "50"))
+# Imagens de uma importação pela API em andamento ao mesmo tempo no pool de
+# reconhecimento, que é compartilhado com as câmeras (0 = metade dos processos).
+# O pool atende na ordem de chegada: com poucas tarefas da importação na frente,
+# os quadros das câmeras não esperam o bloco inteiro.
+IMPORT_MAX_IN_FLIGHT = int(os.getenv("IMPORT_MAX_IN_FLIGHT", "0"))
+# Sem progresso gravado há esse tempo, um job "running" é dado como interrompido
+IMPORT_STALE_SECONDS = float(os.getenv("IMPORT_STALE_SECONDS", "600"))
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = ("name", "cellphone", "image")
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+# Dados do usuário que a galeria precisa, lidos antes do commit (depois dele a
+# instância expira e cada atributo custaria um SELECT)
+_GalleryUser = namedtuple("_GalleryUser", ["id", "name", "cellphone", "image_path"])
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict):
+    # Temporário + rename: outro worker lendo o arquivo nunca o vê pela metade
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+class ImportSource:
+    """Imagens e manifesto de uma importação, vindos de um ZIP ou de uma pasta."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self._zip is None and not os.path.isdir(path):
+            raise ValueError(f"Origem da importação não é um ZIP nem uma pasta: {path}")
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+    def read(self, name: str) -> bytes:
+        name = name.strip().replace("\\", "/").lstrip("/")
+        if not name or ".." in name.split("/"):
+            raise ValueError(f"Caminho de imagem inválido: {name}")
+        if self._zip is not None:
+            try:
+                return self._zip.read(name)
+            except KeyError:
+                raise ValueError(f"Imagem não encontrada no arquivo: {name}")
+        path = os.path.join(self.path, name)
+        if not os.path.isfile(path):
+            raise ValueError(f"Imagem não encontrada na pasta: {name}")
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def read_manifest(content: bytes) -> List[Dict[str, str]]:
+    """Lê o manifesto CSV (colunas name, cellphone, image; separador vírgula ou ponto e vírgula)."""
+    text = content.decode("utf-8-sig")
+    try:
+        dialect = csv.Sniffer().sniff(text.split("\n", 1)[0], delimiters=",;")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    fields = [field.strip().lower() for field in reader.fieldnames or []]
+    missing = [column for column in MANIFEST_COLUMNS if column not in fields]
+    if missing:
+        raise ValueError(f"Manifesto sem as colunas: {', '.join(missing)}")
+    reader.fieldnames = fields
+    return [{column: (row.get(column) or "").strip() for column in MANIFEST_COLUMNS} for row in reader]
+
+
+class UserImporter:
+    """
+    Cadastra usuários em lote a partir de um manifesto e das imagens.
+
+    Os encodings são extraídos no pool de processos e os usuários são gravados
+    em transações de `chunk_size` linhas. Erros de uma linha (imagem ausente,
+    nenhum ou vários rostos, dados inválidos) entram no relatório sem parar o lote.
+    A importação pode ser retomada: o progresso fica num arquivo de estado e
+    celulares já cadastrados são pulados. Com `max_in_flight`, no máximo esse
+    número de imagens fica no pool de cada vez (None = o bloco inteiro).
+    """
+
+    def __init__(
+        self,
+        pool: RecognitionPool = recognition_pool,
+        session_factory=SessionLocal,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        progress: Optional[Callable[[dict], None]] = None,
+        max_in_flight: Optional[int] = None,
+    ):
+        self.pool = pool
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.max_in_flight = max(1, max_in_flight or chunk_size)
+
+    def run(self, source_path: str, manifest_path: Optional[str] = None, state_path: Optional[str] = None, restart: bool = False) -> dict:
+        source = ImportSource(source_path)
+        try:
+            if manifest_path:
+                with open(manifest_path, "rb") as f:
+                    manifest = f.read()
+            else:
+                manifest = source.read(MANIFEST_NAME)
+            rows = read_manifest(manifest)
+
+            if state_path is None:
+                state_path = (source_path.rstrip("/\\") + ".import-state.json") if os.path.isfile(source_path) \
+                    else os.path.join(source_path, ".import-state.json")
+            fingerprint = hashlib.sha256(manifest).hexdigest()
+            report = None if restart else self._load_state(state_path, fingerprint)
+            if report is None:
+                report = {
+                    "manifest_sha256": fingerprint,
+                    "total": len(rows),
+                    "processed": 0,
+                    "created": 0,
+                    "skipped": 0,
+                    "failed": 0,
+                    "errors": [],
+                }
+            elif report["processed"]:
+                logger.info(f"Retomando importação a partir da linha {report['processed'] + 1} de {len(rows)}.")
+
+            seen = set()
+            for start in range(report["processed"], len(rows), self.chunk_size):
+                chunk = list(enumerate(rows[start:start + self.chunk_size], start=start + 1))
+                self._import_chunk(source, chunk, seen, report)
+                report["processed"] = start + len(chunk)
+                self._save_state(state_path, report)
+                if self.progress:
+                    self.progress(report)
+            return report
+        finally:
+            source.close()
+
+    # --- Etapas de um bloco ---
+
+    def _import_chunk(self, source: ImportSource, chunk, seen: set, report: dict):
+        valid = []
+        for line, row in chunk:
+            try:
+                user_data = UserCreate(name=row["name"], cellphone=row["cellphone"])
+            except ValidationError as e:
+                self._fail(report, line, row, "; ".join(err["msg"] for err in e.errors()))
+                continue
+            if user_data.cellphone in seen:
+                self._fail(report, line, row, "Celular repetido no manifesto.")
+                continue
+            seen.add(user_data.cellphone)
+            valid.append((line, row, user_data))
+
+        db = self.session_factory()
+        try:
+            existing = {
+                cellphone for (cellphone,) in db.query(User.cellphone)
+                .filter(User.cellphone.in_([user_data.cellphone for _, _, user_data in valid]))
+            } if valid else set()
+        finally:
+            db.close()
+
+        pending, encoded = deque(), []
+        for line, row, user_data in valid:
+            if user_data.cellphone in existing:
+                report["skipped"] += 1
+                continue
+            try:
+                content = source.read(row["image"])
+            except ValueError as e:
+                self._fail(report, line, row, str(e))
+                continue
+            if len(pending) >= self.max_in_flight:
+                self._collect(pending.popleft(), encoded, report)
+            pending.append((line, row, user_data, content, self.pool.submit(extract_face_encoding, content)))
+        while pending:
+            self._collect(pending.popleft(), encoded, report)
+
+        if not encoded:
+            return
+        try:
+            self._insert(encoded)
+            report["created"] += len(encoded)
+        except Exception as e:
+            # Algum registro do bloco falhou (ex.: celular cadastrado no meio tempo):
+            # grava um a um para isolar o erro
+            logger.warning(f"Falha ao gravar bloco de {len(encoded)} usuários, gravando individualmente: {e}")
+            for item in encoded:
+                try:
+                    self._insert([item])
+                    report["created"] += 1
+                except Exception as row_error:
+                    self._fail(report, item[0], item[1], f"Erro ao gravar usuário: {row_error}")
+
+    def _collect(self, item, encoded: list, report: dict):
+        line, row, user_data, content, future = item
+        try:
+            encoded.append((line, row, user_data, content, future.result()))
+        except ValueError as e:
+            self._fail(report, line, row, str(e))
+        except Exception as e:
+            self._fail(report, line, row, f"Erro ao extrair o encoding: {e}")
+
+    def _insert(self, items):
+        db = self.session_factory()
+        written = []
+        try:
+            users = [
+                User(
+                    name=user_data.name,
+                    cellphone=user_data.cellphone,
+                    encoding=encode_face_encoding(encoding),
+                    image_path=""
+                )
+                for _, _, user_data, _, encoding in items
+            ]
+            db.add_all(users)
+            db.flush()
+            for user, (_, _, _, content, _) in zip(users, items):
+                image_bytes, extension = prepare_image(content)
+                image_filename = user_image_filename(user.name, user.id, extension)
+                write_image(image_filename, image_bytes)
+                written.append(image_url(image_filename))
+                user.image_path = written[-1]
+            GalleryChangeRepository(db).record_many([user.id for user in users], "upsert")
+            gallery_users = [_GalleryUser(user.id, user.name, user.cellphone, user.image_path) for user in users]
+            db.commit()
+            gallery.upsert_many(gallery_users, [encoding for *_, encoding in items])
+        except Exception:
+            db.rollback()
+            for url_path in written:
+                remove_image(url_path)
+            raise
+        finally:
+            db.close()
+
+    def _fail(self, report: dict, line: int, row: dict, error: str):
+        report["failed"] += 1
+        report["errors"].append({"row": line, "cellphone": row.get("cellphone"), "error": error})
+
+    # --- Estado para retomada ---
+
+    def _load_state(self, state_path: str, fingerprint: str) -> Optional[dict]:
+        state = _read_json(state_path)
+        # Outro manifesto: começa do zero
+        return state if state is not None and state.get("manifest_sha256") == fingerprint else None
+
+    def _save_state(self, state_path: str, report: dict):
+        _write_json(state_path, report)
+
+
+class ImportJobs:
+    """
+    Importações disparadas pela API, executadas em segundo plano e consultadas pelo id.
+
+    O estado de cada job fica em disco, em IMPORT_DIR/<job_id>/: `job.json` guarda
+    status, horários e erro, e `state.json` é o progresso gravado pelo importador a
+    cada bloco. Assim a consulta funciona em qualquer worker e depois de reiniciar o
+    servidor. Um job "running" que não grava progresso há IMPORT_STALE_SECONDS (o
+    processo que o executava parou) é informado como "interrupted".
+    """
+
+    JOB_FILE = "job.json"
+    STATE_FILE = "state.json"
+
+    def __init__(self, base_dir: str = IMPORT_DIR, max_jobs: int = IMPORT_MAX_JOBS):
+        self.base_dir = base_dir
+        self.max_jobs = max_jobs
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.base_dir, job_id)
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return job_id
+
+    def start(self, job_id: str, source_path: str, manifest_path: Optional[str] = None):
+        job = {"job_id": job_id, "status": "running", "started_at": time.time(), "finished_at": None, "error": None}
+        self._save_job(job)
+        self._prune()
+        threading.Thread(
+            target=self._run, args=(job, source_path, manifest_path), name=f"user-import-{job_id[:8]}", daemon=True
+        ).start()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        # O id vira caminho no disco: só aceita o formato gerado por new_job_id
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        job = _read_json(os.path.join(self.job_dir(job_id), self.JOB_FILE))
+        if job is None:
+            return None
+        state_path = os.path.join(self.job_dir(job_id), self.STATE_FILE)
+        job["report"] = _read_json(state_path)
+        if job["status"] == "running":
+            last_update = max(job.get("updated_at") or job["started_at"], _mtime(state_path))
+            if time.time() - last_update > IMPORT_STALE_SECONDS:
+                job["status"] = "interrupted"
+        job.pop("updated_at", None)
+        return job
+
+    def _save_job(self, job: dict):
+        job["updated_at"] = time.time()
+        _write_json(os.path.join(self.job_dir(job["job_id"]), self.JOB_FILE), job)
+
+    def _prune(self):
+        """Apaga os jobs concluídos mais antigos além de `max_jobs`."""
+        jobs = []
+        for job_id in os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []:
+            job = _read_json(os.path.join(self.job_dir(job_id), self.JOB_FILE))
+            if job is not None:
+                jobs.append(job)
+        jobs.sort(key=lambda job: job["started_at"])
+        for job in jobs[:max(0, len(jobs) - self.max_jobs)]:
+            if job["status"] != "running":
+                shutil.rmtree(self.job_dir(job["job_id"]), ignore_errors=True)
+
+    def _run(self, job: dict, source_path: str, manifest_path: Optional[str]):
+        try:
+            # O pool é o mesmo das câmeras: a importação só ocupa parte dele por vez
+            max_in_flight = IMPORT_MAX_IN_FLIGHT or max(1, recognition_pool.size // 2)
+            UserImporter(max_in_flight=max_in_flight).run(
+                source_path, manifest_path, state_path=os.path.join(self.job_dir(job["job_id"]), self.STATE_FILE)
+            )
+            job["status"] = "finished"
+        except Exception as e:
+            logger.error(f"Erro na importação {job['job_id']}: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            try:
+                self._save_job(job)
+            except OSError as e:
+                logger.error(f"Não foi possível gravar o estado da importação {job['job_id']}: {e}")
+            # As imagens enviadas não são mais necessárias; o estado fica para consulta
+            for path in (source_path, manifest_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+
+# Instância única do processo.
+import_jobs = ImportJobs()
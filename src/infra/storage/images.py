@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do armazenamento das fotos de cadastro ---
+IMAGE_DIR = os.getenv("IMAGE_DIR", "images")
+# Prefixo com que o caminho da imagem é gravado em `users.image_path`
+IMAGE_URL_PREFIX = "/images"
+# Miniaturas geradas sob demanda (maior lado em px) e guardadas em IMAGE_DIR/.thumbs/<tamanho>/
+THUMBNAIL_SIZES = tuple(int(v) for v in os.getenv("THUMBNAIL_SIZES", "64,256").split(",") if v.strip())
+THUMBNAIL_DIR = os.path.join(IMAGE_DIR, ".thumbs")
+THUMBNAIL_JPEG_QUALITY = int(os.getenv("THUMBNAIL_JPEG_QUALITY", "85"))
+IMAGE_ETAG_CACHE_SIZE = int(os.getenv("IMAGE_ETAG_CACHE_SIZE", "4096"))
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+)
+
+
+def image_extension(image_file_content: bytes) -> Optional[str]:
+    """Extensão do arquivo pelos bytes iniciais (JPEG ou PNG); None para outros formatos."""
+    for signature, extension in _SIGNATURES:
+        if image_file_content.startswith(signature):
+            return extension
+    return None
+
+
+def prepare_image(image_file_content: bytes):
+    """
+    Devolve (bytes, extensão) a gravar. JPEG e PNG são gravados como chegaram,
+    sem decodificar nem recomprimir; outros formatos são convertidos para JPEG.
+    """
+    extension = image_extension(image_file_content)
+    if extension:
+        return image_file_content, extension
+
+    image_bgr = cv2.imdecode(np.frombuffer(image_file_content, np.uint8), cv2.IMREAD_COLOR)
+    if image_bgr is None:
+        raise ValueError("Não foi possível decodificar a imagem enviada. Verifique o formato.")
+    ok, encoded = cv2.imencode(".jpg", image_bgr)
+    if not ok:
+        raise ValueError("Não foi possível converter a imagem enviada para JPEG.")
+    return encoded.tobytes(), ".jpg"
+
+
+def user_image_filename(name: str, user_id: int, extension: str) -> str:
+    return f"{name.replace(' ', '_').lower()}_{user_id}{extension}"
+
+
+def image_url(filename: str) -> str:
+    return f"{IMAGE_URL_PREFIX}/{filename}"
+
+
+def image_file_path(url_path: Optional[str]) -> Optional[str]:
+    """Caminho no disco de um `image_path` gravado no banco (ou None se não for uma imagem local)."""
+    if not url_path or not url_path.startswith(IMAGE_URL_PREFIX + "/"):
+        return None
+    filename = os.path.basename(url_path)
+    return os.path.join(IMAGE_DIR, filename) if filename else None
+
+
+def _write_temp(directory: str, suffix: str, content: bytes) -> str:
+    # Arquivos ocultos (".tmp-") não são servidos por resolve_image
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _write_atomic(path: str, content: bytes):
+    # Arquivo temporário na mesma pasta + rename: quem lê nunca vê um arquivo pela metade
+    tmp_path = _write_temp(os.path.dirname(path), os.path.splitext(path)[1], content)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_image(filename: str, content: bytes) -> str:
+    """Grava a imagem de forma atômica e descarta as miniaturas da versão anterior."""
+    path = os.path.join(IMAGE_DIR, filename)
+    _write_atomic(path, content)
+    remove_thumbnails(filename)
+    return path
+
+
+def stage_image(filename: str, content: bytes) -> str:
+    """
+    Grava a imagem num arquivo temporário em IMAGE_DIR, sem tocar na foto atual.
+    Depois do commit ela entra no lugar com `publish_staged_image`; se o commit
+    falhar, é apagada com `discard_staged_image`.
+    """
+    return _write_temp(IMAGE_DIR, os.path.splitext(filename)[1], content)
+
+
+def publish_staged_image(staged_path: str, filename: str) -> str:
+    """Coloca a imagem preparada no lugar de `filename` (rename atômico) e descarta as miniaturas antigas."""
+    path = os.path.join(IMAGE_DIR, filename)
+    os.replace(staged_path, path)
+    remove_thumbnails(filename)
+    return path
+
+
+def discard_staged_image(staged_path: str):
+    try:
+        os.remove(staged_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Não foi possível remover a imagem temporária {staged_path}: {e}")
+
+
+def remove_image(url_path: Optional[str]):
+    path = image_file_path(url_path)
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.error(f"Não foi possível remover a imagem {path}: {e}")
+    if path:
+        remove_thumbnails(os.path.basename(path))
+
+
+def resolve_image(filename: str) -> Optional[str]:
+    """
+    Caminho de uma imagem pedida pelo nome, ou None se não existir. Recusa
+    nomes com diretórios ou ocultos, para não servir nada fora de IMAGE_DIR.
+    """
+    if not filename or filename != os.path.basename(filename) or filename.startswith("."):
+        return None
+    path = os.path.join(IMAGE_DIR, filename)
+    root = os.path.realpath(IMAGE_DIR)
+    if os.path.dirname(os.path.realpath(path)) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _thumbnail_path(filename: str, size: int) -> str:
+    # Miniaturas são sempre JPEG, mesmo quando a original é PNG
+    return os.path.join(THUMBNAIL_DIR, str(size), f"{filename}.jpg")
+
+
+def thumbnail(filename: str, size: int) -> Optional[str]:
+    """
+    Caminho da miniatura de `filename` com o maior lado em `size` px, gerada na
+    primeira vez que é pedida. Uma miniatura mais antiga que a original é refeita.
+    """
+    source = resolve_image(filename)
+    if source is None:
+        return None
+    path = _thumbnail_path(filename, size)
+    try:
+        if os.stat(path).st_mtime_ns >= os.stat(source).st_mtime_ns:
+            return path
+    except FileNotFoundError:
+        pass
+
+    image_bgr = cv2.imread(source, cv2.IMREAD_COLOR)
+    if image_bgr is None:
+        return None
+    height, width = image_bgr.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1.0:
+        image_bgr = cv2.resize(
+            image_bgr, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA
+        )
+    ok, encoded = cv2.imencode(".jpg", image_bgr, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+    if not ok:
+        return None
+    _write_atomic(path, encoded.tobytes())
+    return path
+
+
+def remove_thumbnails(filename: str):
+    for size_dir in os.listdir(THUMBNAIL_DIR) if os.path.isdir(THUMBNAIL_DIR) else []:
+        path = os.path.join(THUMBNAIL_DIR, size_dir, f"{filename}.jpg")
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Não foi possível remover a miniatura {path}: {e}")
+
+
+class _ETagCache:
+    """ETags fortes (hash do conteúdo), calculadas uma vez por versão do arquivo (mtime + tamanho)."""
+
+    def __init__(self, max_entries: int = IMAGE_ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> str:
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(path)
+                return entry[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                digest.update(block)
+        etag = f'"{digest.hexdigest()[:32]}"'
+
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, etag)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+
+# Instância única do processo.
+etags = _ETagCache()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+# O banco dos testes precisa estar definido antes de importar src.infra.sqlalchemy.database
+_DB_DIR = tempfile.mkdtemp(prefix="facerec-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'test.sqlite')}")
+os.environ.setdefault("GALLERY_SNAPSHOT_ENABLED", "false")
+os.environ.setdefault("LOG_WRITER_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+from src.infra.sqlalchemy.database import Base, SessionLocal, engine  # noqa: E402
+from src.infra.sqlalchemy.models import admin, gallery_change, user, user_encoding, user_log  # noqa: E402,F401
+
+
+@pytest.fixture
+def db_sessions():
+    """Cria as tabelas vazias e devolve a fábrica de sessões; tudo é apagado no fim do teste."""
+    Base.metadata.create_all(engine)
+    sessions = []
+
+    def open_session():
+        session = SessionLocal()
+        sessions.append(session)
+        return session
+
+    yield open_session
+    for session in sessions:
+        session.close()
+    Base.metadata.drop_all(engine)
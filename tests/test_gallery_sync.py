@@ -0,0 +1,148 @@
+import numpy as np
+
+from src.infra.recognition import gallery as gallery_module
+from src.infra.recognition.codec import encode_face_encoding
+from src.infra.recognition.gallery import FaceGallery
+from src.infra.sqlalchemy.models.gallery_change import GalleryChange
+from src.infra.sqlalchemy.models.user import User
+
+
+def _add_user(session, name: str, change_id: int, seed: int) -> int:
+    encoding = np.random.default_rng(seed).normal(0.0, 0.1, 128)
+    user = User(name=name, cellphone=f"1199999{seed:04d}", image_path="", encoding=encode_face_encoding(encoding))
+    session.add(user)
+    session.flush()
+    # O id da alteração é fixado para reproduzir a ordem em que o MySQL os reserva
+    session.add(GalleryChange(id=change_id, user_id=user.id, op="upsert"))
+    return user.id
+
+
+def test_sync_keeps_version_before_change_committed_late(db_sessions):
+    gallery = FaceGallery()
+    reader = db_sessions()
+    gallery.ensure_loaded(reader)
+
+    # A reservou a alteração 1, mas B confirma a alteração 2 antes de A
+    session_a, session_b = db_sessions(), db_sessions()
+    bia = _add_user(session_b, "Bia", change_id=2, seed=2)
+    session_b.commit()
+
+    gallery.sync(reader, force=True)
+    assert bia in gallery.snapshot().row_of
+    # A versão não passa da lacuna: a alteração 1 ainda pode aparecer
+    assert gallery.version == 0
+    assert gallery.snapshot().ahead == {2}
+
+    ana = _add_user(session_a, "Ana", change_id=1, seed=1)
+    session_a.commit()
+    reader.rollback()
+
+    gallery.sync(reader, force=True)
+    assert ana in gallery.snapshot().row_of
+    assert bia in gallery.snapshot().row_of
+    assert gallery.version == 2
+    assert gallery.snapshot().ahead == frozenset()
+
+
+def test_sync_skips_gap_after_grace_period(db_sessions, monkeypatch):
+    gallery = FaceGallery()
+    reader = db_sessions()
+    gallery.ensure_loaded(reader)
+
+    # A alteração 1 nunca é confirmada (rollback)
+    session_a, session_b = db_sessions(), db_sessions()
+    _add_user(session_a, "Ana", change_id=1, seed=1)
+    session_a.rollback()
+    _add_user(session_b, "Bia", change_id=2, seed=2)
+    session_b.commit()
+
+    gallery.sync(reader, force=True)
+    assert gallery.version == 0
+
+    monkeypatch.setattr(gallery_module, "GALLERY_CHANGE_GAP_SECONDS", 0.0)
+    gallery.sync(reader, force=True)
+    assert gallery.version == 2
+
+
+def test_load_from_db_stops_before_gap(db_sessions):
+    session_b = db_sessions()
+    bia = _add_user(session_b, "Bia", change_id=2, seed=2)
+    session_b.commit()
+
+    gallery = FaceGallery()
+    gallery.ensure_loaded(db_sessions())
+    assert bia in gallery.snapshot().row_of
+    assert gallery.version == 0
+    assert gallery.snapshot().ahead == {2}
+
+
+def test_local_delete_survives_own_store_generation(db_sessions, tmp_path, monkeypatch):
+    from src.infra.recognition import snapshot_store
+    from src.infra.recognition.snapshot_store import SnapshotStore
+
+    monkeypatch.setattr(snapshot_store, "GALLERY_SNAPSHOT_CHECK_SECONDS", 0.0)
+    # A regravação só acontece quando o teste chama flush_store
+    monkeypatch.setattr(gallery_module, "GALLERY_SNAPSHOT_DEBOUNCE_SECONDS", 3600.0)
+    session = db_sessions()
+    ana = _add_user(session, "Ana", change_id=1, seed=1)
+    session.commit()
+
+    gallery = FaceGallery(store=SnapshotStore(str(tmp_path)))
+    gallery.ensure_loaded(session)
+
+    bia = _add_user(session, "Bia", change_id=2, seed=2)
+    session.commit()
+    bia_user = session.get(User, bia)
+    gallery.upsert(bia_user, [np.random.default_rng(2).normal(0.0, 0.1, 128)])
+    gallery.flush_store()
+    assert gallery.version == 2
+
+    # Remoção local logo depois da regravação: a geração gravada ainda tem Ana
+    session.delete(session.get(User, ana))
+    session.add(GalleryChange(id=3, user_id=ana, op="delete"))
+    session.commit()
+    gallery.remove(ana)
+
+    gallery.ensure_loaded(session)
+    assert ana not in gallery.snapshot().row_of
+    assert bia in gallery.snapshot().row_of
+    gallery.flush_store()
+
+
+def test_prune_keeps_mark_and_lagging_worker_reloads(db_sessions, monkeypatch):
+    session = db_sessions()
+    ana = _add_user(session, "Ana", change_id=1, seed=1)
+    bia = _add_user(session, "Bia", change_id=2, seed=2)
+    session.commit()
+
+    worker_a, worker_b = FaceGallery(), FaceGallery()
+    worker_a.ensure_loaded(db_sessions())
+    worker_b.ensure_loaded(db_sessions())
+
+    session.delete(session.get(User, ana))
+    session.add(GalleryChange(id=3, user_id=ana, op="delete"))
+    cia = _add_user(session, "Cia", change_id=4, seed=4)
+    session.commit()
+
+    reader = db_sessions()
+    worker_a.sync(reader, force=True)
+    assert worker_a.version == 4
+
+    # Com horizonte zero a versão confirmada agora já pode ser podada
+    monkeypatch.setattr(gallery_module, "GALLERY_CHANGE_GAP_SECONDS", 0.0)
+    monkeypatch.setattr(gallery_module, "GALLERY_CHANGE_RETENTION_SECONDS", 0.0)
+    worker_a._prune_changes(reader)
+    remaining = reader.query(GalleryChange.id, GalleryChange.op).order_by(GalleryChange.id).all()
+    assert [(row.id, row.op) for row in remaining] == [(4, "pruned")]
+
+    # B estava na versão 2: as alterações 3 e 4 sumiram, então relê tudo
+    worker_b.sync(db_sessions(), force=True)
+    assert worker_b.version == 4
+    assert ana not in worker_b.snapshot().row_of
+    assert {bia, cia} <= set(worker_b.snapshot().row_of)
+
+    # Uma carga nova começa depois da marca da poda, sem tratá-la como lacuna
+    fresh = FaceGallery()
+    fresh.ensure_loaded(db_sessions())
+    assert fresh.version == 4
+    assert fresh.snapshot().ahead == frozenset()
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from src.infra.sqlalchemy.models.user import User
+from src.infra.sqlalchemy.models.user_log import UserLog
+from src.infra.sqlalchemy.repositories.user_log import UserLogRepository
+
+
+def test_pages_follow_log_id_and_show_user_id(db_sessions):
+    session = db_sessions()
+    ana = User(name="Ana", cellphone="11999990001", image_path="", encoding=b"")
+    bia = User(name="Bia", cellphone="11999990002", image_path="", encoding=b"")
+    session.add_all([ana, bia])
+    session.flush()
+    # Mesmo horário em todos os logs: a ordem da página depende só do id do log
+    log_time = datetime(2026, 1, 1, 8, 0, 0)
+    session.add_all([UserLog(user_id=uid, log_time=log_time) for uid in (ana.id, bia.id, ana.id, bia.id, ana.id)])
+    session.commit()
+
+    repository = UserLogRepository(session)
+    items, cursor = repository.get_user_log_page(limit=2)
+    seen = list(items)
+    while cursor:
+        items, cursor = repository.get_user_log_page(limit=2, cursor=cursor)
+        seen.extend(items)
+
+    assert [item["id"] for item in seen] == [5, 4, 3, 2, 1]
+    assert [item["user_id"] for item in seen] == [ana.id, bia.id, ana.id, bia.id, ana.id]
+
+    items, _ = repository.get_user_log_page(limit=10, user_id=bia.id)
+    assert {item["user_id"] for item in items} == {bia.id}